@@ -1,12 +1,225 @@
 
-import json
-from typing import List, Dict, Tuple
+import heapq
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict, namedtuple
+from itertools import chain, repeat, takewhile
+from operator import itemgetter
+from threading import Lock
+from typing import List, Dict, Mapping, Optional, Tuple, Union
+
+from sherlock_instrumentation import AnalysisSample
+from sherlock_observation import Observation, Vocabulary
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for analyze_batch
+    np = None
+
+# Cue categories scored during base weighting, in the order they are applied.
+SCORING_CATEGORIES = (
+    "PHYSICAL_MARKERS", "BEHAVIORAL_CLUSTERS", "MICRO_EXPRESSIONS",
+    "FORENSIC_LINGUISTICS", "VOCAL_MARKERS", "DARK_TRIAD_MARKERS",
+)
+
+
+class _ReadOnlyDict(dict):
+    """dict that rejects in-place changes; copies and pickles come back as plain dicts"""
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kwargs):
+        raise TypeError("cue_library is read-only; assign a new library to change it")
+
+    __setitem__ = __delitem__ = __ior__ = clear = pop = popitem = setdefault = update = _read_only
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+def _read_only_library(library: Dict[str, Dict[str, Dict[str, float]]]) -> Mapping:
+    """Copies a nested-dict library into read-only dicts, so in-place edits raise TypeError"""
+    return _ReadOnlyDict(
+        (category, _ReadOnlyDict((name, _ReadOnlyDict(weights)) for name, weights in entries.items()))
+        for category, entries in library.items()
+    )
+
+
+# Upper bound on the record x profile scores analyze_batch holds densely at once.
+_BATCH_BLOCK_CELLS = 1 << 21
+# Score buckets analyze_batch uses to select top_k candidates before sorting.
+_TOP_K_BUCKETS = 64
+
+
+def _csr(indices: List, values: List) -> Tuple:
+    """Packs per-row index and value columns into CSR (row pointers, indices, float64 values)"""
+    ptr = np.zeros(len(indices) + 1, dtype=np.intp)
+    np.cumsum([len(row) for row in indices], out=ptr[1:])
+    return (ptr, np.array([i for row in indices for i in row], dtype=np.intp),
+            np.array([v for row in values for v in row], dtype=np.float64))
+
+
+def _csr_rows(ptr, rows) -> Tuple:
+    """Entry positions of the given CSR rows, back to back, and each row's entry count"""
+    starts = ptr[rows]
+    counts = ptr[rows + 1] - starts
+    return np.repeat(starts - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum()), counts
+
+
+def _pack_weights(values: List) -> object:
+    """Packs a weight column into a compact array, keeping non-integer weights as-is"""
+    if all(type(value) is int for value in values):
+        return array("q", values)
+    return tuple(values)
+
+
+# Default score thresholds and the (confidence, threat level) pair for each band.
+GRADE_THRESHOLDS = (6, 10, 15, 20)
+GRADES = (
+    ("Low", "Normal"),
+    ("Medium", "Low"),
+    ("High", "Moderate"),
+    ("Very High", "High"),
+    ("Critical/Certain", "Extreme"),
+)
+
+
+# Legacy report keys, kept readable on ProfileResult.
+_RESULT_KEYS = {"Profile": 0, "Probability_Score": 1, "Confidence": 2, "Threat_Level": 3}
+
+
+class ProfileResult(namedtuple("ProfileResult", ["profile", "score", "confidence", "threat_level"])):
+    """One ranked profile of an analysis report.
+
+    Immutable and tuple-backed; the legacy dict keys ("Profile",
+    "Probability_Score", "Confidence", "Threat_Level") still work as indexes.
+    """
+
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = _RESULT_KEYS[key]
+        return tuple.__getitem__(self, key)
+
+    def as_dict(self) -> Dict:
+        """Returns the legacy dict form of this result"""
+        return {"Profile": self[0], "Probability_Score": self[1],
+                "Confidence": self[2], "Threat_Level": self[3]}
+
+
+def trim_report(report: List[ProfileResult], top_k: Optional[int], min_score: Optional[float]) -> List[ProfileResult]:
+    """Applies top_k / min_score to a report that is already ranked"""
+    if top_k is not None:
+        report = report[:top_k]
+    if min_score is not None:
+        return list(takewhile(lambda result: result[1] >= min_score, report))
+    return list(report)
+
+
+class CueIndex:
+    """Compiled scoring index; replaced as a whole so readers never see a partial rebuild"""
+
+    __slots__ = ("profile_ids", "profile_names", "cue_index", "cue_index_by_id", "context_index",
+                 "batch_matrices", "profile_cues", "integral")
+
+    def __init__(self, profile_names: List[str], cue_index: Dict, context_index: Dict, vocabulary: Vocabulary):
+        self.profile_names = tuple(profile_names)
+        self.profile_ids = {profile: pid for pid, profile in enumerate(profile_names)}
+        # cue -> tuple of (category rank, profile ids, weights) segments
+        self.cue_index = cue_index
+        self.cue_index_by_id = {vocabulary.cue_id(cue): entry for cue, entry in cue_index.items()}
+        # context -> (profile ids, modifiers)
+        self.context_index = context_index
+        # Matrices for analyze_batch and the profile -> cue index are built on first use.
+        self.batch_matrices = None
+        self.profile_cues = None
+        self.integral = None
+
+
+# Compiled incongruence rules: (all_of, any_of, none_of, message, all_mask,
+# any_mask, none_mask) per rule, the trigger indexes and rules with no trigger.
+RuleIndex = namedtuple("RuleIndex", ["compiled", "rule_index", "rule_index_by_id", "unconditional"])
+
+
+# Score breakdown of one profile: (cue, weight) pairs in scoring order and
+# (context, modifier, clamped) triples in the order contexts were applied.
+Contribution = namedtuple("Contribution", ["profile", "score", "cues", "contexts"])
+
+
+def _is_integral(weights) -> bool:
+    return isinstance(weights, array) or (isinstance(weights, memoryview) and weights.format == "q")
+
+
+CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "evictions", "maxsize", "currsize"])
+
+
+class AnalysisCache:
+    """Thread-safe, size-bounded LRU map from analysis cache keys to analysis results"""
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        # Bumped by clear(); results computed under an older generation are dropped.
+        self.generation = 0
+        self._data = OrderedDict()
+        self._lock = Lock()
+        self._hits = self._misses = self._evictions = 0
+
+    def get(self, key: Tuple):
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+                self._data.move_to_end(key)
+            return value
+
+    def put(self, key: Tuple, value, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(self._hits, self._misses, self._evictions, self.maxsize, len(self._data))
+
 
 class DeductionEngine:
-    def __init__(self):
+    def __init__(self, cache_size: int = 0, grade_thresholds: Tuple[float, ...] = GRADE_THRESHOLDS,
+                 grades: Tuple[Tuple[str, str], ...] = GRADES, library_path: Optional[str] = None):
+        # Stable integer ids for cue and context names, shared by Observations.
+        self.vocabulary = Vocabulary()
+        # Optional LRU cache of analyze() results; cache_size=0 disables it.
+        self._cache = AnalysisCache(cache_size) if cache_size > 0 else None
+        self.set_grades(grade_thresholds, grades)
+        # External library file (see load_library); None means the built-in library.
+        self.library_path = None
+        self.library_version = "builtin"
+        # Bumped whenever the scoring index (library_generation) or the compiled
+        # rules (rules_generation) are replaced, even if library_version stays
+        # the same; cheap to compare for staleness.
+        self.library_generation = 0
+        self.rules_generation = 0
+        self._library_stat = None
+        self._compiled_library = None
+        self._reload_lock = Lock()
+        # Optional sherlock_instrumentation.Instrumentation; None disables stage timing.
+        self.instrumentation = None
+
         # --- LAYER 1: THE CUE DATABASE ---
         # Weighted cues based on forensic psychology and behavioral profiling.
-        self.cue_library = {
+        cue_library = {
             "PHYSICAL_MARKERS": {
                 "inward_watch_face": {"Military": 9, "Medical": 7, "Tactical": 8},
                 "tactical_nail_cut": {"Military": 7, "Security": 6, "Blue_Collar": 4},
@@ -94,92 +307,749 @@ class DeductionEngine:
             }
         }
 
+        # --- LAYER 2: THE CONFLICT RULES ---
+        # A rule fires when every "all_of" cue, at least one "any_of" cue (if
+        # listed) and none of the "none_of" cues are observed.
+        incongruence_rules = [
+            # Status incongruence
+            {"all_of": ["expensive_watch", "frayed_collar"],
+             "message": "STATUS INCONGRUENCE: Subject prioritizes public signaling over private maintenance."},
+            # Emotional leakage
+            {"all_of": ["calm_voice", "shaking_hands"],
+             "message": "EMOTIONAL LEAKAGE: Subject is suppressing high adrenaline/rage."},
+            {"all_of": ["asymmetric_smile", "duchenne_smile"],
+             "message": "EMOTIONAL MASKING: Genuine and fake happiness signals detected simultaneously."},
+            # Linguistic incongruence
+            {"all_of": ["past_tense_present_event", "spontaneous_corrections"],
+             "message": "LINGUISTIC PARADOX: Deceptive distancing co-exists with truth-telling markers."},
+            # Behavioral contradiction
+            {"all_of": ["hand_steepling", "ankle_locking"],
+             "message": "CONFIDENCE-FEAR SPLIT: Displays dominance while body shows defensive retreat."},
+            # Micro-expression vs macro behavior
+            {"all_of": ["flash_fear_eyes", "lack_of_startle_response"],
+             "message": "FEAR SUPPRESSION: Micro-fear detected but controlled startle response suggests training or psychopathy."},
+        ]
+
+        if library_path is None:
+            self.cue_library = cue_library
+            self.incongruence_rules = incongruence_rules
+        else:
+            # Skip compiling the built-in library the file replaces; its rules
+            # are only compiled if the file brings none of its own.
+            self._incongruence_rules = incongruence_rules
+            self._rules = None
+            self.load_library(library_path)
+
+    def set_grades(self, thresholds: Tuple[float, ...], grades: Tuple[Tuple[str, str], ...]):
+        """Sets the score bands: grades[i] applies from thresholds[i - 1] up to thresholds[i]"""
+        if len(grades) != len(thresholds) + 1:
+            raise ValueError("grades needs exactly one more entry than thresholds")
+        if any(a >= b for a, b in zip(thresholds, thresholds[1:])):
+            raise ValueError("grade thresholds must be strictly increasing")
+        self.grade_thresholds = tuple(thresholds)
+        self.grades = tuple(tuple(grade) for grade in grades)
+        self._confidences = tuple(grade[0] for grade in self.grades)
+        self._threat_levels = tuple(grade[1] for grade in self.grades)
+        if self._cache is not None:
+            self._cache.clear()
+
+    # --- LAYER 1b: THE COMPILED INDEX ---
+    @property
+    def cue_library(self) -> Mapping[str, Mapping[str, Mapping[str, float]]]:
+        """Read-only view of the library being scored; assign a new dict to change it"""
+        if self._cue_library is None:
+            # Compiled libraries only build the nested-dict form on demand.
+            self._cue_library = _read_only_library(self._compiled_library.to_cue_library())
+        return self._cue_library
+
+    @cue_library.setter
+    def cue_library(self, library: Dict[str, Dict[str, Dict[str, float]]]):
+        self._cue_library = _read_only_library(library)
+        self._compiled_library = None
+        self.rebuild_index()
+
+    def load_library(self, path: str):
+        """Loads a JSON or compiled library file and swaps it in atomically.
+
+        The file may omit incongruence_rules, in which case the current rules
+        are kept. Concurrent analyze() calls see either the old or the new
+        library, never a mix of the two.
+        """
+        from sherlock_library_store import CompiledLibrary, open_library, stat_key
+
+        with self._reload_lock:
+            identity = stat_key(path)
+            library = open_library(path)
+            if isinstance(library, CompiledLibrary):
+                cue_library = None
+                index = self._index_from_compiled(library)
+            else:
+                cue_library = _read_only_library(library.cue_library)
+                index = self._compile_index(cue_library)
+            rules = library.incongruence_rules
+            if rules is None and self._rules is None:
+                rules = self._incongruence_rules
+            compiled_rules = self._compile_rules(rules) if rules is not None else self._rules
+
+            self._index = index
+            self._rules = compiled_rules
+            self._cue_library = cue_library
+            self._compiled_library = library if cue_library is None else None
+            if rules is not None:
+                self._incongruence_rules = rules
+            self.library_path = path
+            self.library_version = library.version
+            self.library_generation += 1
+            self.rules_generation += 1
+            self._library_stat = identity
+            if self._cache is not None:
+                self._cache.clear()
+
+    def reload_if_changed(self) -> bool:
+        """Reloads the library file if it was replaced or modified; returns True on reload.
+
+        Nothing watches the file: long-running callers poll this (the scoring
+        service once per batch, the Streamlit app once per rerun). A check is
+        one stat() call.
+        """
+        from sherlock_library_store import stat_key
+
+        if self.library_path is None:
+            return False
+        try:
+            identity = stat_key(self.library_path)
+        except FileNotFoundError:
+            return False
+        if identity == self._library_stat:
+            return False
+        self.load_library(self.library_path)
+        return True
+
+    def _index_from_compiled(self, library) -> CueIndex:
+        """Builds a CueIndex whose arrays are views into the mapped library file"""
+        ranks = {category: rank for rank, category in enumerate(SCORING_CATEGORIES)}
+        cue_index = {}
+        for category, cue, profile_ids, weights in library.segments():
+            rank = ranks.get(category)
+            if rank is not None:
+                cue_index[cue] = cue_index.get(cue, ()) + ((rank, profile_ids, weights),)
+        context_index = {context: (profile_ids, modifiers)
+                         for context, profile_ids, modifiers in library.context_entries()}
+        return CueIndex(list(library.profiles), cue_index, context_index, self.vocabulary)
+
+    def rebuild_index(self):
+        """Recompiles the inverted cue index from cue_library"""
+        self._install_index(self._compile_index(self.cue_library))
+
+    def _compile_index(self, library: Dict[str, Dict[str, Dict[str, float]]]) -> CueIndex:
+        profile_ids = {}
+        profile_names = []
+
+        def intern(profile: str) -> int:
+            pid = profile_ids.get(profile)
+            if pid is None:
+                pid = profile_ids[profile] = len(profile_names)
+                profile_names.append(profile)
+            return pid
+
+        # cue -> tuple of (category rank, profile ids, weights) segments.  A cue
+        # listed under several categories keeps one segment per category so the
+        # first-touch order of profiles (used to break score ties) is unchanged.
+        cue_index = {}
+        for rank, category in enumerate(SCORING_CATEGORIES):
+            for cue, weights in library.get(category, {}).items():
+                segment = (
+                    rank,
+                    array("l", [intern(profile) for profile in weights]),
+                    _pack_weights(list(weights.values())),
+                )
+                cue_index[cue] = cue_index.get(cue, ()) + (segment,)
+
+        context_index = {}
+        for context, modifiers in library.get("CONTEXT_FILTERS", {}).items():
+            context_index[context] = (
+                array("l", [intern(profile) for profile in modifiers]),
+                _pack_weights(list(modifiers.values())),
+            )
+
+        return CueIndex(profile_names, cue_index, context_index, self.vocabulary)
+
+    def _install_index(self, index: CueIndex):
+        self._index = index
+        self.library_generation += 1
+        if self._cache is not None:
+            self._cache.clear()
+
+    @staticmethod
+    def _get_batch_matrices(index: CueIndex) -> Dict:
+        """Builds the CSR cue -> segment, segment x profile and context x profile matrices for analyze_batch"""
+        if index.batch_matrices is not None:
+            return index.batch_matrices
+        if np is None:
+            raise ImportError("analyze_batch requires numpy")
+
+        integral = True
+        cue_ids = {}
+        cue_ptr = [0]
+        segment_ranks, segment_pids, segment_weights = [], [], []
+        for cue, segments in index.cue_index.items():
+            cue_ids[cue] = len(cue_ids)
+            for rank, profile_ids, weights in segments:
+                segment_ranks.append(rank)
+                segment_pids.append(profile_ids)
+                segment_weights.append(weights)
+                integral = integral and _is_integral(weights)
+            cue_ptr.append(len(segment_ranks))
+
+        context_ids = {}
+        context_pids, context_modifiers = [], []
+        for context, (profile_ids, modifiers) in index.context_index.items():
+            context_ids[context] = len(context_ids)
+            context_pids.append(profile_ids)
+            context_modifiers.append(modifiers)
+            integral = integral and _is_integral(modifiers)
+
+        segment_ptr, segment_pid, segment_weight = _csr(segment_pids, segment_weights)
+        context_ptr, context_pid, context_modifier = _csr(context_pids, context_modifiers)
+        index.batch_matrices = {
+            # Segments of cue i are segment_ptr rows cue_ptr[i]:cue_ptr[i + 1], in rank order.
+            "cue_ids": cue_ids,
+            "cue_ptr": np.array(cue_ptr, dtype=np.intp),
+            "segment_rank": np.array(segment_ranks, dtype=np.intp),
+            "segment_ptr": segment_ptr,
+            "segment_pid": segment_pid,
+            "segment_weight": segment_weight,
+            "segment_width": int(np.diff(segment_ptr).max(initial=0)),
+            "context_ids": context_ids,
+            "context_ptr": context_ptr,
+            "context_pid": context_pid,
+            "context_modifier": context_modifier,
+            "integral": integral,
+        }
+        return index.batch_matrices
+
     # --- LAYER 2: THE CONFLICT DETECTOR ---
-    def detect_incongruence(self, observed_cues: List[str]) -> List[str]:
-        conflicts = []
+    @property
+    def incongruence_rules(self) -> List[Dict]:
+        return self._incongruence_rules
+
+    @incongruence_rules.setter
+    def incongruence_rules(self, rules: List[Dict]):
+        self._incongruence_rules = rules
+        self.rebuild_rules()
+
+    def rebuild_rules(self):
+        """Recompiles the cue -> rule index; call after mutating incongruence_rules in place"""
+        self._rules = self._compile_rules(self._incongruence_rules)
+        self.rules_generation += 1
+        if self._cache is not None:
+            self._cache.clear()
 
-        # Status incongruence
-        if "expensive_watch" in observed_cues and "frayed_collar" in observed_cues:
-            conflicts.append("STATUS INCONGRUENCE: Subject prioritizes public signaling over private maintenance.")
+    def _compile_rules(self, rules: List[Dict]) -> RuleIndex:
+        vocabulary = self.vocabulary
+        compiled = []
+        rule_index = {}
+        unconditional = []
+        for rule_id, rule in enumerate(rules):
+            all_of = frozenset(rule.get("all_of", ()))
+            any_of = frozenset(rule.get("any_of", ()))
+            none_of = frozenset(rule.get("none_of", ()))
+            if "message" not in rule:
+                raise ValueError(f"incongruence rule {rule_id} has no message")
+            if not (all_of or any_of or none_of):
+                raise ValueError(f"incongruence rule {rule_id} has no conditions")
+            compiled.append((all_of, any_of, none_of, rule["message"],
+                             vocabulary.cue_mask(all_of), vocabulary.cue_mask(any_of),
+                             vocabulary.cue_mask(none_of)))
 
-        # Emotional leakage
-        if "calm_voice" in observed_cues and "shaking_hands" in observed_cues:
-            conflicts.append("EMOTIONAL LEAKAGE: Subject is suppressing high adrenaline/rage.")
+            # A rule can only fire if one of its trigger cues is present: any
+            # single all_of cue (all are required), otherwise each any_of cue.
+            if all_of:
+                triggers = (min(all_of),)
+            elif any_of:
+                triggers = any_of
+            else:
+                unconditional.append(rule_id)
+                continue
+            for cue in triggers:
+                rule_index.setdefault(cue, []).append(rule_id)
 
-        if "asymmetric_smile" in observed_cues and "duchenne_smile" in observed_cues:
-            conflicts.append("EMOTIONAL MASKING: Genuine and fake happiness signals detected simultaneously.")
+        rule_index = {cue: tuple(ids) for cue, ids in rule_index.items()}
+        return RuleIndex(
+            compiled,
+            rule_index,
+            {vocabulary.cue_id(cue): ids for cue, ids in rule_index.items()},
+            tuple(unconditional),
+        )
 
-        # Linguistic incongruence
-        if "past_tense_present_event" in observed_cues and "spontaneous_corrections" in observed_cues:
-            conflicts.append("LINGUISTIC PARADOX: Deceptive distancing co-exists with truth-telling markers.")
+    def detect_incongruence(self, observed_cues: Union[List[str], Observation]) -> List[str]:
+        rules = self._rules
+        compiled = rules.compiled
+        return [compiled[rule_id][3] for rule_id in self._matching_rules(observed_cues, rules)]
 
-        # Behavioral contradiction
-        if "hand_steepling" in observed_cues and "ankle_locking" in observed_cues:
-            conflicts.append("CONFIDENCE-FEAR SPLIT: Displays dominance while body shows defensive retreat.")
+    def _matching_rules(self, observed_cues: Union[List[str], Observation], rules: RuleIndex) -> List[int]:
+        """Ids of the rules that fire for observed_cues, in rule order"""
+        if isinstance(observed_cues, Observation) and observed_cues.vocabulary is self.vocabulary:
+            return self._matching_rules_mask(observed_cues, rules)
 
-        # Micro-expression vs macro behavior
-        if "flash_fear_eyes" in observed_cues and "lack_of_startle_response" in observed_cues:
-            conflicts.append("FEAR SUPPRESSION: Micro-fear detected but controlled startle response suggests training or psychopathy.")
+        present = observed_cues if isinstance(observed_cues, (set, frozenset)) else set(observed_cues)
+        rule_index = rules.rule_index
+        candidates = set(rules.unconditional)
+        for cue in present:
+            rule_ids = rule_index.get(cue)
+            if rule_ids is not None:
+                candidates.update(rule_ids)
+        if not candidates:
+            return []
 
-        return conflicts
+        matched = []
+        compiled = rules.compiled
+        for rule_id in sorted(candidates):
+            all_of, any_of, none_of = compiled[rule_id][:3]
+            if all_of and not all_of <= present:
+                continue
+            if any_of and any_of.isdisjoint(present):
+                continue
+            if none_of and not none_of.isdisjoint(present):
+                continue
+            matched.append(rule_id)
+        return matched
+
+    def _matching_rules_mask(self, observation: Observation, rules: RuleIndex) -> List[int]:
+        """Rule evaluation on an Observation's cue bitmask"""
+        mask = observation.cue_mask
+        rule_index = rules.rule_index_by_id
+        candidates = set(rules.unconditional)
+        for cid in observation.cue_ids():
+            rule_ids = rule_index.get(cid)
+            if rule_ids is not None:
+                candidates.update(rule_ids)
+
+        matched = []
+        compiled = rules.compiled
+        for rule_id in sorted(candidates):
+            all_mask, any_mask, none_mask = compiled[rule_id][4:]
+            if mask & all_mask != all_mask:
+                continue
+            if any_mask and not mask & any_mask:
+                continue
+            if mask & none_mask:
+                continue
+            matched.append(rule_id)
+        return matched
+
+    def observe(self, cues: List[str] = (), contexts: List[str] = ()) -> Observation:
+        """Encodes cue and context names as a deduplicated Observation"""
+        return self.vocabulary.observe(cues, contexts)
 
     # --- LAYER 3: THE ANALYSIS LOGIC ---
-    def analyze(self, observed_cues: List[str], environmental_context: List[str]) -> Tuple[List[Dict], List[str]]:
-        profiles = {}
+    def analyze(self, observed_cues: Union[List[str], Observation],
+                environmental_context: Optional[List[str]] = None, top_k: Optional[int] = None,
+                min_score: Optional[float] = None) -> Tuple[List[ProfileResult], List[str]]:
+        """Scores profiles for the observed cues under the given contexts.
+
+        observed_cues may be a list of cue names or an Observation; an
+        Observation supplies its own contexts when environmental_context is None.
+        Only the top_k highest profiles scoring at least min_score are reported
+        when those are given.
+        With the result cache enabled, results are keyed on what determines
+        them (see _cache_key), so a cached call returns exactly what an
+        uncached one would.
+        Calls that are scored (not served from the cache) report per-stage
+        timings and counters to self.instrumentation when one is attached.
+        """
+        cache = self._cache
+        if cache is None:
+            return self._analyze(observed_cues, environmental_context, top_k, min_score)
+
+        generation = cache.generation
+        key = self._cache_key(observed_cues, environmental_context)
+        cached = cache.get(key)
+        if cached is None:
+            report, conflicts = self._analyze(observed_cues, environmental_context)
+            cached = (tuple(report), tuple(conflicts))
+            cache.put(key, cached, generation)
+        # Results are immutable; only the containers are copied for the caller.
+        return trim_report(cached[0], top_k, min_score), list(cached[1])
+
+    def _cache_key(self, observed_cues: Union[List[str], Observation],
+                   environmental_context: Optional[List[str]]) -> Tuple:
+        """Result cache key: everything that can change what analyze() returns.
+
+        That is the library cues in scoring order, duplicates included (they
+        fix the totals and the tie order), the library contexts in the order
+        given (the clamp at zero makes order matter) and the ids of the rules
+        that fire. Names the library and rules do not know cannot change the
+        result and are left out, so they never grow the key or the vocabulary.
+        """
+        index = self._index
+        if isinstance(observed_cues, Observation) and environmental_context is None:
+            environmental_context = observed_cues.contexts
+        cue_index = index.cue_index
+        segments = []
+        for position, cue in enumerate(observed_cues):
+            for segment in cue_index.get(cue, ()):
+                segments.append((segment[0], position, cue))
+        segments.sort()
+        context_index = index.context_index
+        return (tuple(cue for _, _, cue in segments),
+                tuple(context for context in environmental_context or () if context in context_index),
+                tuple(self._matching_rules(observed_cues, self._rules)))
+
+    def _analyze(self, observed_cues: Union[List[str], Observation], environmental_context: Optional[List[str]],
+                 top_k: Optional[int] = None,
+                 min_score: Optional[float] = None) -> Tuple[List[ProfileResult], List[str]]:
+        probe = self.instrumentation
+        if probe is not None:
+            clock = probe.clock
+            started = clock()
+        index = self._index
+        context_index = index.context_index
+        # Raw per-profile totals indexed by profile id; None marks untouched profiles.
+        scores = [None] * len(index.profile_names)
+        touched = []
+        matched = clamps = 0
 
         # 1. Base Weighting
-        for category in ["PHYSICAL_MARKERS", "BEHAVIORAL_CLUSTERS", "MICRO_EXPRESSIONS", 
-                        "FORENSIC_LINGUISTICS", "VOCAL_MARKERS", "DARK_TRIAD_MARKERS"]:
-            for cue in observed_cues:
-                if cue in self.cue_library.get(category, {}):
-                    for profile, weight in self.cue_library[category][cue].items():
-                        profiles[profile] = profiles.get(profile, 0) + weight
+        segments = []
+        if isinstance(observed_cues, Observation):
+            if environmental_context is None:
+                environmental_context = observed_cues.contexts
+        if isinstance(observed_cues, Observation) and observed_cues.vocabulary is self.vocabulary:
+            cue_index = index.cue_index_by_id
+            keys = observed_cues.cue_ids()
+        else:
+            cue_index = index.cue_index
+            keys = observed_cues
+        for key in keys:
+            entry = cue_index.get(key)
+            if entry is not None:
+                matched += 1
+                segments.extend(entry)
+        segments.sort(key=itemgetter(0))
+
+        for _, profile_ids, weights in segments:
+            for pid, weight in zip(profile_ids, weights):
+                score = scores[pid]
+                if score is None:
+                    touched.append(pid)
+                    scores[pid] = weight
+                else:
+                    scores[pid] = score + weight
+        if probe is not None:
+            weighted = clock()
 
         # 2. Context Adjustment
-        for context in environmental_context:
-            if context in self.cue_library["CONTEXT_FILTERS"]:
-                for profile, modifier in self.cue_library["CONTEXT_FILTERS"][context].items():
-                    if profile in profiles:
-                        profiles[profile] += modifier
-                        # Ensure no negative scores
-                        if profiles[profile] < 0:
-                            profiles[profile] = 0
+        for context in environmental_context or ():
+            entry = context_index.get(context)
+            if entry is None:
+                continue
+            for pid, modifier in zip(*entry):
+                score = scores[pid]
+                if score is not None:
+                    score += modifier
+                    # Ensure no negative scores
+                    if score >= 0:
+                        scores[pid] = score
+                    else:
+                        scores[pid] = 0
+                        clamps += 1
+        if probe is not None:
+            adjusted = clock()
 
         # 3. Confidence Calculation & Sorting
+        floor = 0 if min_score is None else min_score
+        candidates = [pid for pid in touched if scores[pid] > 0 and scores[pid] >= floor]
+        if top_k is not None and top_k < len(candidates):
+            # Partial selection; ties keep first-touch order like the full sort.
+            ranked = heapq.nlargest(top_k, candidates, key=scores.__getitem__)
+        else:
+            ranked = sorted(candidates, key=scores.__getitem__, reverse=True)
+
+        profile_names = index.profile_names
+        thresholds = self.grade_thresholds
+        grades = self.grades
         final_report = []
-        sorted_profiles = sorted(profiles.items(), key=lambda x: x[1], reverse=True)
+        for pid in ranked:
+            score = scores[pid]
+            confidence, threat_level = grades[bisect_right(thresholds, score)]
+            final_report.append(ProfileResult(profile_names[pid], score, confidence, threat_level))
+
+        if probe is None:
+            return final_report, self.detect_incongruence(observed_cues)
+        ranked_at = clock()
+        conflicts = self.detect_incongruence(observed_cues)
+        probe.record(AnalysisSample(weighted - started, adjusted - weighted, ranked_at - adjusted,
+                                    clock() - ranked_at, matched, len(touched), clamps, len(conflicts)))
+        return final_report, conflicts
+
+    def analyze_batch(self, observations: List[Union[List[str], Observation]], contexts: Optional[List[List[str]]] = None,
+                      chunk_size: int = 4096, top_k: Optional[int] = None,
+                      min_score: Optional[float] = None) -> List[Tuple[List[ProfileResult], List[str]]]:
+        """Scores many observation sets at once; each result matches analyze() on that record.
 
-        for profile, score in sorted_profiles:
-            if score <= 0:
+        Records are encoded as a cue-indicator matrix in one vectorized pass
+        and multiplied against the precomputed segment x profile weight matrix,
+        chunk_size records at a time. Context modifiers and the clamp-at-zero
+        rule are applied in the order each record lists its contexts. With
+        top_k, each record's candidates are narrowed down before anything is
+        sorted, and first-touch tie order is only worked out for tied scores.
+        """
+        if contexts is None:
+            contexts = [obs.contexts if isinstance(obs, Observation) else () for obs in observations]
+        elif len(contexts) != len(observations):
+            raise ValueError("observations and contexts must have the same length")
+
+        results = []
+        for start in range(0, len(observations), chunk_size):
+            chunk_obs = observations[start:start + chunk_size]
+            chunk_ctx = contexts[start:start + chunk_size]
+            results.extend(self._analyze_chunk(chunk_obs, chunk_ctx, top_k, min_score))
+        return results
+
+    def _analyze_chunk(self, observations: List[List[str]], contexts: List[List[str]], top_k: Optional[int],
+                       min_score: Optional[float]) -> List[Tuple[List[ProfileResult], List[str]]]:
+        index = self._index
+        bounds, ranked_pids, ranked_scores, ranked_grades = self._rank_chunk(index, observations, contexts,
+                                                                            min_score, top_k)
+        # Every ranked entry of the chunk at once, then sliced per record; tuple.__new__
+        # is what ProfileResult._make calls, without a Python-level call per entry.
+        grades = ranked_grades.tolist()
+        entries = list(map(tuple.__new__, repeat(ProfileResult), zip(
+            map(index.profile_names.__getitem__, ranked_pids.tolist()), ranked_scores.tolist(),
+            map(self._confidences.__getitem__, grades), map(self._threat_levels.__getitem__, grades))))
+        bounds = bounds.tolist()
+        return [(entries[start:end], self.detect_incongruence(cues))
+                for start, end, cues in zip(bounds, bounds[1:], observations)]
+
+    def _rank_chunk(self, index: CueIndex, observations: List[List[str]], contexts: List[List[str]],
+                    min_score: Optional[float], top_k: Optional[int] = None) -> Tuple:
+        """Scores a chunk without building ProfileResults.
+
+        Returns (bounds, profile ids, scores, grade indexes): numpy arrays
+        holding every record's ranked profiles (at most top_k of them) back to
+        back, record i occupying positions bounds[i] to bounds[i + 1].
+        """
+        matrices = self._get_batch_matrices(index)
+        n_profiles = len(index.profile_names)
+        block = max(1, _BATCH_BLOCK_CELLS // max(n_profiles, 1))
+        if len(observations) <= block:
+            return self._rank_block(matrices, n_profiles, observations, contexts, min_score, top_k)
+
+        parts = [self._rank_block(matrices, n_profiles, observations[start:start + block],
+                                  contexts[start:start + block], min_score, top_k)
+                 for start in range(0, len(observations), block)]
+        offsets = np.cumsum([0] + [part[0][-1] for part in parts[:-1]])
+        bounds = np.concatenate([parts[0][0][:1]] + [part[0][1:] + offset for part, offset in zip(parts, offsets)])
+        return (bounds,) + tuple(np.concatenate([part[column] for part in parts]) for column in (1, 2, 3))
+
+    def _rank_block(self, matrices: Dict, n_profiles: int, observations: List[List[str]], contexts: List[List[str]],
+                    min_score: Optional[float], top_k: Optional[int]) -> Tuple:
+        """_rank_chunk for at most _BATCH_BLOCK_CELLS record x profile scores"""
+        n_rows = len(observations)
+        integral = matrices["integral"]
+
+        # Cue-indicator matrix in coordinate form, encoded in one pass over the
+        # chunk: (record, input position, segment) for every library cue.
+        lengths = np.fromiter(map(len, observations), dtype=np.intp, count=n_rows)
+        names = list(chain.from_iterable(observations))
+        cue_ids = np.fromiter(map(matrices["cue_ids"].get, names, repeat(-1)), dtype=np.intp, count=len(names))
+        rows = np.repeat(np.arange(n_rows), lengths)
+        positions = np.arange(len(names)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        known = cue_ids >= 0
+        segments, counts = _csr_rows(matrices["cue_ptr"], cue_ids[known])
+        rows = np.repeat(rows[known], counts)
+        positions = np.repeat(positions[known], counts)
+        ranks = matrices["segment_rank"][segments]
+        if not integral:
+            # Float totals depend on the order weights are added in, so follow analyze()'s scoring order.
+            order = np.argsort(rows * len(SCORING_CATEGORIES) + ranks, kind="stable")
+            rows, positions, segments, ranks = rows[order], positions[order], segments[order], ranks[order]
+
+        # 1. Base Weighting: indicator x segment-profile weight matrix, one dense
+        # row of profile totals per record.
+        entries, widths = _csr_rows(matrices["segment_ptr"], segments)
+        keys = np.repeat(rows, widths) * n_profiles + matrices["segment_pid"][entries]
+        scores = np.bincount(keys, weights=matrices["segment_weight"][entries], minlength=n_rows * n_profiles)
+
+        # 2. Context Adjustment, one context position at a time.
+        context_names = list(chain.from_iterable(contexts))
+        if context_names:
+            context_lengths = np.fromiter(map(len, contexts), dtype=np.intp, count=n_rows)
+            context_ids = np.fromiter(map(matrices["context_ids"].get, context_names, repeat(-1)),
+                                      dtype=np.intp, count=len(context_names))
+            context_rows = np.repeat(np.arange(n_rows), context_lengths)
+            known = context_ids >= 0
+            context_rows, context_ids = context_rows[known], context_ids[known]
+            context_positions = np.arange(len(context_ids)) - np.searchsorted(context_rows, context_rows)
+            touched = None
+            for j in range(int(context_positions.max(initial=-1)) + 1):
+                at = context_positions == j
+                offsets, counts = _csr_rows(matrices["context_ptr"], context_ids[at])
+                targets = np.repeat(context_rows[at], counts) * n_profiles + matrices["context_pid"][offsets]
+                current = scores[targets]
+                # Only profiles some cue touched are adjusted; a zero total may be either.
+                applies = current != 0
+                if not applies.all():
+                    if touched is None:
+                        touched = np.zeros(len(scores), dtype=bool)
+                        touched[keys] = True
+                    applies |= touched[targets]
+                adjusted = np.maximum(current + matrices["context_modifier"][offsets], 0)
+                scores[targets] = np.where(applies, adjusted, current)
+
+        # 3. Confidence Calculation & Sorting
+        keep = scores > 0
+        if min_score is not None:
+            keep &= scores >= min_score
+        candidates = np.flatnonzero(keep)
+        ranked_rows = candidates // n_profiles
+        ranked_scores = scores[candidates]
+        if top_k is not None and len(candidates):
+            # Select before sorting: bucket the scores and keep, per record, the
+            # highest buckets that together hold at least top_k candidates.
+            buckets = (ranked_scores * ((_TOP_K_BUCKETS - 1) / ranked_scores.max())).astype(np.intp)
+            histogram = np.bincount(ranked_rows * _TOP_K_BUCKETS + buckets, minlength=n_rows * _TOP_K_BUCKETS)
+            reached = np.cumsum(histogram.reshape(n_rows, _TOP_K_BUCKETS)[:, ::-1], axis=1) >= top_k
+            lowest = np.where(reached.any(axis=1), _TOP_K_BUCKETS - 1 - reached.argmax(axis=1), 0)
+            keep = buckets >= lowest[ranked_rows]
+            candidates, ranked_rows, ranked_scores = candidates[keep], ranked_rows[keep], ranked_scores[keep]
+        # Record, then score descending; the order within a tie is fixed below.
+        if integral:
+            ranked_scores = np.rint(ranked_scores).astype(np.int64)
+            order = np.argsort(ranked_rows * (int(ranked_scores.max(initial=0)) + 1) - ranked_scores)
+        else:
+            order = np.lexsort((-ranked_scores, ranked_rows))
+        candidates, ranked_rows, ranked_scores = candidates[order], ranked_rows[order], ranked_scores[order]
+        bounds = np.searchsorted(ranked_rows, np.arange(n_rows + 1))
+
+        if top_k is not None:
+            # Only the first top_k of each record and anything tied with the last of them can be reported.
+            rank = np.arange(len(candidates)) - bounds[ranked_rows]
+            window = rank < top_k
+            over = np.flatnonzero(np.diff(bounds) > top_k)
+            if len(over) and top_k > 0:
+                cutoff = np.zeros(n_rows, dtype=ranked_scores.dtype)
+                cutoff[over] = ranked_scores[bounds[over] + top_k - 1]
+                window |= (rank >= top_k) & (ranked_scores == cutoff[ranked_rows])
+            candidates, ranked_rows, ranked_scores = candidates[window], ranked_rows[window], ranked_scores[window]
+            bounds = np.searchsorted(ranked_rows, np.arange(n_rows + 1))
+
+        # Ties keep first-touch order like analyze(): only tied entries need their first touch.
+        same = (ranked_rows[1:] == ranked_rows[:-1]) & (ranked_scores[1:] == ranked_scores[:-1])
+        if same.any():
+            tied = np.zeros(len(candidates), dtype=bool)
+            tied[1:] = same
+            tied[:-1] |= same
+            tied = np.flatnonzero(tied)
+            groups = np.cumsum(np.concatenate(([True], ~same)))[tied]
+            # (rank, input position, position in segment) of each weight on a tied
+            # profile, as one number; the smallest is the profile's first touch.
+            tied_ids = np.zeros(len(scores), dtype=np.intp)
+            tied_ids[candidates[tied]] = np.arange(1, len(tied) + 1)
+            hits = np.flatnonzero(tied_ids[keys])
+            slot_ends = np.cumsum(widths)
+            slots = np.searchsorted(slot_ends, hits, side="right")
+            touches = ((ranks[slots] * (int(lengths.max()) + 1) + positions[slots]) * matrices["segment_width"]
+                       + hits - (slot_ends[slots] - widths[slots]))
+            first_touch = np.full(len(tied), np.iinfo(np.int64).max, dtype=np.int64)
+            np.minimum.at(first_touch, tied_ids[keys[hits]] - 1, touches)
+            candidates[tied] = candidates[tied][np.argsort(groups * (int(first_touch.max()) + 1) + first_touch)]
+
+        if top_k is not None:
+            keep = np.arange(len(candidates)) - bounds[ranked_rows] < top_k
+            candidates, ranked_rows, ranked_scores = candidates[keep], ranked_rows[keep], ranked_scores[keep]
+            bounds = np.searchsorted(ranked_rows, np.arange(n_rows + 1))
+        return (bounds, candidates % n_profiles, ranked_scores,
+                np.searchsorted(self.grade_thresholds, ranked_scores, side="right"))
+
+    # --- LAYER 4: EXPLAINABILITY ---
+    @staticmethod
+    def _get_profile_cues(index: CueIndex) -> List[Tuple[Tuple[str, float], ...]]:
+        """Builds the reverse index: per profile id, (cue, total weight) pairs strongest first"""
+        if index.profile_cues is None:
+            totals = [{} for _ in index.profile_names]
+            for cue, entry in index.cue_index.items():
+                for _, profile_ids, weights in entry:
+                    for pid, weight in zip(profile_ids, weights):
+                        totals[pid][cue] = totals[pid].get(cue, 0) + weight
+            index.profile_cues = [tuple(sorted(cues.items(), key=itemgetter(1), reverse=True))
+                                  for cues in totals]
+        return index.profile_cues
+
+    def cues_for_profile(self, profile: str, top_n: Optional[int] = None) -> List[Tuple[str, float]]:
+        """Returns the cues weighting a profile with their total weight, strongest first"""
+        index = self._index
+        pid = index.profile_ids.get(profile)
+        if pid is None:
+            raise KeyError(f"unknown profile {profile!r}")
+        cues = self._get_profile_cues(index)[pid]
+        return list(cues if top_n is None else cues[:top_n])
+
+    def explain(self, observed_cues: Union[List[str], Observation], environmental_context: Optional[List[str]] = None,
+                profiles: Optional[List[str]] = None) -> List[Contribution]:
+        """Breaks profile scores down into the cue weights and context modifiers behind them.
+
+        Without profiles, returns one Contribution per profile of the analyze()
+        report, in report order. With profiles, returns those profiles (in the
+        order given) that any observed cue touches, even if they score zero.
+        Computed on demand; analyze() itself is unaffected.
+        """
+        index = self._index
+        if isinstance(observed_cues, Observation) and environmental_context is None:
+            environmental_context = observed_cues.contexts
+        wanted = None if profiles is None else {index.profile_ids.get(profile) for profile in profiles}
+
+        segments = []
+        for cue in observed_cues:
+            for rank, profile_ids, weights in index.cue_index.get(cue, ()):
+                segments.append((rank, cue, profile_ids, weights))
+        segments.sort(key=itemgetter(0))
+
+        # pid -> [running score, cue contributions, context contributions], in first-touch order
+        breakdown = {}
+        for _, cue, profile_ids, weights in segments:
+            for pid, weight in zip(profile_ids, weights):
+                if wanted is not None and pid not in wanted:
+                    continue
+                entry = breakdown.get(pid)
+                if entry is None:
+                    breakdown[pid] = [weight, [(cue, weight)], []]
+                else:
+                    entry[0] += weight
+                    entry[1].append((cue, weight))
+
+        for context in environmental_context or ():
+            entry = index.context_index.get(context)
+            if entry is None:
                 continue
+            for pid, modifier in zip(*entry):
+                state = breakdown.get(pid)
+                if state is not None:
+                    score = state[0] + modifier
+                    state[0] = score if score >= 0 else 0
+                    state[2].append((context, modifier, score < 0))
 
-            confidence = "Low"
-            threat_level = "Normal"
-
-            if score >= 20: 
-                confidence = "Critical/Certain"
-                threat_level = "Extreme"
-            elif score >= 15: 
-                confidence = "Very High"
-                threat_level = "High"
-            elif score >= 10: 
-                confidence = "High"
-                threat_level = "Moderate"
-            elif score >= 6: 
-                confidence = "Medium"
-                threat_level = "Low"
-
-            final_report.append({
-                "Profile": profile,
-                "Probability_Score": score,
-                "Confidence": confidence,
-                "Threat_Level": threat_level
-            })
-
-        return final_report, self.detect_incongruence(observed_cues)
+        profile_names = index.profile_names
+        results = [Contribution(profile_names[pid], score, tuple(cues), tuple(contexts))
+                   for pid, (score, cues, contexts) in breakdown.items()]
+        if profiles is None:
+            return sorted((result for result in results if result.score > 0), key=itemgetter(1), reverse=True)
+        by_name = {result.profile: result for result in results}
+        return [by_name[profile] for profile in profiles if profile in by_name]
+
+    def cache_info(self) -> Optional["CacheInfo"]:
+        """Returns hit/miss/eviction statistics for the result cache, or None if disabled"""
+        return self._cache.info() if self._cache is not None else None
+
+    def clear_cache(self):
+        if self._cache is not None:
+            self._cache.clear()
 
     def get_all_cues_by_category(self) -> Dict[str, List[str]]:
         """Returns all available cues organized by category for UI population"""
+        if self._cue_library is None:
+            return self._compiled_library.cues_by_category()
         result = {}
         for category, cues in self.cue_library.items():
             if category != "CONTEXT_FILTERS":
@@ -188,4 +1058,70 @@ class DeductionEngine:
 
     def get_context_options(self) -> List[str]:
         """Returns all available context filters"""
+        if self._cue_library is None:
+            return list(self._compiled_library.contexts)
         return list(self.cue_library["CONTEXT_FILTERS"].keys())
+
+    # --- COMPILED INDEX ACCESS ---
+    # For modules that score incrementally or in columns (sherlock_session,
+    # sherlock_tracking, sherlock_columnar, ...). Profile ids index profile_names
+    # and rule ids index rule_messages; both are only valid for the current
+    # library_generation / rules_generation.
+    @property
+    def profile_names(self) -> Tuple[str, ...]:
+        """Profile names of the current library, indexed by profile id"""
+        return self._index.profile_names
+
+    def profile_id(self, profile: str) -> int:
+        pid = self._index.profile_ids.get(profile)
+        if pid is None:
+            raise KeyError(f"unknown profile {profile!r}")
+        return pid
+
+    @property
+    def integral_weights(self) -> bool:
+        """True if every cue weight and context modifier is an integer, so scores are exact"""
+        index = self._index
+        if index.integral is None:
+            index.integral = (all(_is_integral(weights) for entry in index.cue_index.values()
+                                  for _, _, weights in entry)
+                              and all(_is_integral(modifiers) for _, modifiers in index.context_index.values()))
+        return index.integral
+
+    def cue_segments(self, cue: str) -> Tuple:
+        """(category rank, profile ids, weights) segments a cue adds, in scoring order; () if unknown"""
+        return self._index.cue_index.get(cue, ())
+
+    def context_modifiers(self, context: str) -> Dict[int, float]:
+        """Profile id -> modifier for a context; empty if unknown"""
+        entry = self._index.context_index.get(context)
+        return {} if entry is None else dict(zip(*entry))
+
+    @property
+    def rule_messages(self) -> List[str]:
+        """Incongruence messages of the compiled rules, indexed by rule id"""
+        return [rule[3] for rule in self._rules.compiled]
+
+    @property
+    def rule_conditions(self) -> List[Tuple[frozenset, frozenset, frozenset]]:
+        """(all_of, any_of, none_of) cue sets of the compiled rules, indexed by rule id"""
+        return [rule[:3] for rule in self._rules.compiled]
+
+    def matching_rule_ids(self, observed_cues: Union[List[str], Observation]) -> List[int]:
+        """Ids of the rules that fire for observed_cues, in rule order"""
+        return self._matching_rules(observed_cues, self._rules)
+
+    def rank_arrays(self, observations: List[Union[List[str], Observation]], contexts: Optional[List[List[str]]] = None,
+                    top_k: Optional[int] = None, min_score: Optional[float] = None) -> Tuple:
+        """analyze_batch without ProfileResults (requires numpy).
+
+        Returns (bounds, profile ids, scores, grade indexes): numpy arrays
+        holding every record's ranked profiles back to back, record i
+        occupying positions bounds[i] to bounds[i + 1]. Grade indexes point
+        into grades.
+        """
+        if contexts is None:
+            contexts = [obs.contexts if isinstance(obs, Observation) else () for obs in observations]
+        elif len(contexts) != len(observations):
+            raise ValueError("observations and contexts must have the same length")
+        return self._rank_chunk(self._index, observations, contexts, min_score, top_k)
@@ -1,8 +1,32 @@
 
 import streamlit as st
-import json
+import os
+import time
 from deduction_engine_enhanced import DeductionEngine
 
+# Start of this script run; the footer reports how long the rerun took.
+RERUN_STARTED = time.perf_counter()
+
+# Analysis results memoized per (cues, contexts) inside the shared engine
+ANALYSIS_CACHE_SIZE = 4096
+
+# Optional JSON or compiled cue library file; the built-in library otherwise.
+LIBRARY_PATH = os.environ.get("SHERLOCK_LIBRARY")
+
+
+@st.cache_resource
+def load_engine():
+    """One engine per server process, shared by every session and rerun"""
+    return DeductionEngine(cache_size=ANALYSIS_CACHE_SIZE, library_path=LIBRARY_PATH)
+
+
+@st.cache_resource(max_entries=4)
+def load_cue_listings(library_generation):
+    """Cue and context listings for the observation panel, computed once per loaded library"""
+    engine = load_engine()
+    return engine.get_all_cues_by_category(), engine.get_context_options()
+
+
 # Page configuration
 st.set_page_config(
     page_title="Sherlock Holmes Deduction System",
@@ -89,177 +113,231 @@ st.markdown("""
     </style>
     """, unsafe_allow_html=True)
 
-# Initialize session state
-if 'selected_cues' not in st.session_state:
-    st.session_state.selected_cues = []
-if 'selected_contexts' not in st.session_state:
-    st.session_state.selected_contexts = []
-if 'analysis_done' not in st.session_state:
-    st.session_state.analysis_done = False
+# Body part groups of the observation panel; a category may appear in several.
+BODY_PARTS = {
+    "🧠 Head & Face": ["MICRO_EXPRESSIONS", "BEHAVIORAL_CLUSTERS"],
+    "✋ Hands & Arms": ["PHYSICAL_MARKERS"],
+    "🗣️ Speech & Voice": ["FORENSIC_LINGUISTICS", "VOCAL_MARKERS"],
+    "💭 Behavioral Patterns": ["DARK_TRIAD_MARKERS", "BEHAVIORAL_CLUSTERS"]
+}
 
-# Initialize engine
-engine = DeductionEngine()
+DARK_TRIAD_PROFILES = ["Psychopathy", "Narcissism", "Machiavellianism",
+                       "Manipulator", "Dark_Persuasion", "Antisocial"]
+DANGER_PROFILES = ["Psychopathy", "Narcissism", "Machiavellianism",
+                   "Deception", "Manipulator", "Hostility"]
 
-# Header
-st.markdown('<div class="main-header">🔍 THE SHERLOCK SYSTEM 🔍</div>', unsafe_allow_html=True)
-st.markdown('<div class="sub-header">"You see, but you do not observe." - Sherlock Holmes</div>', unsafe_allow_html=True)
 
-# Create two columns for layout
-col1, col2 = st.columns([1, 1])
+def cue_select_key(body_part, category):
+    return f"cues_{body_part}_{category}"
 
-with col1:
-    st.markdown("## 👤 Human Observation Interface")
 
+def pretty(name):
+    return name.replace('_', ' ').title()
+
+
+def drop_stale_selections(all_cues, context_options):
+    """Removes picks that a reloaded library no longer offers"""
+    for body_part, categories in BODY_PARTS.items():
+        for category in categories:
+            key = cue_select_key(body_part, category)
+            if key in st.session_state:
+                offered = set(all_cues.get(category, ()))
+                st.session_state[key] = [cue for cue in st.session_state[key] if cue in offered]
+    if "context_select" in st.session_state:
+        offered = set(context_options)
+        st.session_state.context_select = [ctx for ctx in st.session_state.context_select if ctx in offered]
+
+
+# Initialize session state.  The multiselect widgets keep their own selections
+# under their keys; "analysis" is the (cues, contexts) snapshot last analyzed.
+if 'analysis' not in st.session_state:
+    st.session_state.analysis = None
+if 'analysis_error' not in st.session_state:
+    st.session_state.analysis_error = False
+
+# Initialize engine; a replaced library file is picked up on the next rerun
+engine = load_engine()
+try:
+    engine.reload_if_changed()
+except Exception as exc:
+    st.warning(f"Library file could not be reloaded, still using version {engine.library_version}: {exc}")
+# Keyed on the generation, not the version: a reloaded file may keep its version string.
+all_cues, context_options = load_cue_listings(engine.library_generation)
+if st.session_state.get("library_generation") != engine.library_generation:
+    drop_stale_selections(all_cues, context_options)
+    st.session_state.library_generation = engine.library_generation
+
+
+def current_selection():
+    """Cues and contexts currently picked in the observation panel"""
+    selected_cues = []
+    for body_part, categories in BODY_PARTS.items():
+        for category in categories:
+            selected_cues.extend(st.session_state.get(cue_select_key(body_part, category), []))
+    return selected_cues, list(st.session_state.get("context_select", []))
+
+
+def start_analysis():
+    selected_cues, selected_contexts = current_selection()
+    st.session_state.analysis_error = not selected_cues
+    if selected_cues:
+        st.session_state.analysis = (selected_cues, selected_contexts)
+
+
+def reset_analysis():
+    st.session_state.analysis = None
+    st.session_state.analysis_error = False
+    st.session_state.context_select = []
+    for body_part, categories in BODY_PARTS.items():
+        for category in categories:
+            st.session_state[cue_select_key(body_part, category)] = []
+
+
+@st.fragment
+def observation_panel():
+    """Context and cue pickers; changing a selection reruns only this fragment"""
     # Context Bar
     st.markdown('<div class="context-section"><h3>🌍 Environmental Context</h3></div>', unsafe_allow_html=True)
-    context_options = engine.get_context_options()
-    selected_contexts = st.multiselect(
+    st.multiselect(
         "Select environmental factors that may influence interpretation:",
         context_options,
+        format_func=pretty,
         key="context_select"
     )
-    st.session_state.selected_contexts = selected_contexts
 
     st.markdown("---")
 
-    # Get all cues by category
-    all_cues = engine.get_all_cues_by_category()
-
-    # Body part sections with emojis
-    body_parts = {
-        "🧠 Head & Face": ["MICRO_EXPRESSIONS", "BEHAVIORAL_CLUSTERS"],
-        "✋ Hands & Arms": ["PHYSICAL_MARKERS"],
-        "🗣️ Speech & Voice": ["FORENSIC_LINGUISTICS", "VOCAL_MARKERS"],
-        "💭 Behavioral Patterns": ["DARK_TRIAD_MARKERS", "BEHAVIORAL_CLUSTERS"]
-    }
-
-    selected_cues = []
-
-    for body_part, categories in body_parts.items():
+    for body_part, categories in BODY_PARTS.items():
         with st.expander(body_part, expanded=False):
             for category in categories:
                 if category in all_cues:
-                    st.markdown(f"**{category.replace('_', ' ')}**")
-                    for cue in all_cues[category]:
-                        unique_key = f"cue_{category}_{cue}"
-                        if st.checkbox(
-                            cue.replace('_', ' ').title(), 
-                            key=unique_key
-                        ):
-                            selected_cues.append(cue)
-
-    st.session_state.selected_cues = selected_cues
-
-    # Analyze button
-    st.markdown("---")
-    if st.button("🔬 ANALYZE SUBJECT", type="primary", use_container_width=True):
-        if len(selected_cues) == 0:
-            st.error("⚠️ Please select at least one observable cue before analysis.")
-        else:
-            st.session_state.analysis_done = True
-            st.rerun()
+                    st.multiselect(
+                        category.replace('_', ' '),
+                        all_cues[category],
+                        format_func=pretty,
+                        key=cue_select_key(body_part, category)
+                    )
+
+    selected_cues, _ = current_selection()
+    st.caption(f"{len(set(selected_cues))} cue(s) selected")
+    # Drawn here so that picking a cue clears it without a full rerun.
+    if selected_cues:
+        st.session_state.analysis_error = False
+    elif st.session_state.analysis_error:
+        st.error("⚠️ Please select at least one observable cue before analysis.")
+
+
+def dashboard(observation):
+    """Warnings, insights and profile cards for the analyzed observation"""
+    report, conflicts = engine.analyze(observation)
+
+    # Check for Dark Triad markers
+    dark_triad_detected = any(item.profile in DARK_TRIAD_PROFILES for item in report)
+
+    # Display warning if Dark Triad detected
+    if dark_triad_detected:
+        st.markdown("""
+            <div class="warning-box">
+                <h3>⚠️ CAUTION: HIGH MANIPULATION RISK DETECTED</h3>
+                <p>Subject exhibits markers consistent with Dark Triad personality traits. 
+                Exercise extreme caution in interactions. Verify all claims independently.</p>
+            </div>
+        """, unsafe_allow_html=True)
+
+    # Display incongruence findings
+    if conflicts:
+        st.markdown("### 🎯 Sherlock's Insights (Incongruence Analysis)")
+        for conflict in conflicts:
+            st.markdown(f"""
+                <div class="insight-box">
+                    <strong>💡 {conflict}</strong>
+                </div>
+            """, unsafe_allow_html=True)
 
-with col2:
-    st.markdown("## 📊 Deduction Dashboard")
+    # Display profile cards
+    st.markdown("### 🧩 Psychological Profile Analysis")
+
+    if not report:
+        st.info("No significant profiles detected with current observations.")
+        return
+
+    for profile_data in report[:8]:  # Top 8 profiles
+        profile = profile_data["Profile"]
+        score = profile_data["Probability_Score"]
+        confidence = profile_data["Confidence"]
+        threat = profile_data["Threat_Level"]
+
+        # Determine if this is a high-risk profile
+        is_danger = profile in DANGER_PROFILES and confidence in ["High", "Very High", "Critical/Certain"]
+
+        card_class = "profile-card-danger" if is_danger else "profile-card"
+
+        # Confidence color
+        conf_class = {
+            "Critical/Certain": "confidence-critical",
+            "Very High": "confidence-critical",
+            "High": "confidence-high",
+            "Medium": "confidence-medium",
+            "Low": "confidence-low"
+        }.get(confidence, "confidence-low")
+
+        # Threat indicator
+        threat_emoji = {
+            "Extreme": "🔴",
+            "High": "🟠",
+            "Moderate": "🟡",
+            "Low": "🟢",
+            "Normal": "⚪"
+        }.get(threat, "⚪")
+
+        st.markdown(f"""
+            <div class="{card_class}">
+                <h4>{threat_emoji} {profile.replace('_', ' ')}</h4>
+                <p><strong>Probability Score:</strong> {score}</p>
+                <p><strong>Confidence:</strong> <span class="{conf_class}">{confidence}</span></p>
+                <p><strong>Threat Assessment:</strong> {threat}</p>
+            </div>
+        """, unsafe_allow_html=True)
+
+
+def observation_summary(observation):
+    with st.expander("📝 Observation Summary", expanded=False):
+        st.markdown("**Selected Cues:**")
+        for cue in observation.cues:
+            st.markdown(f"- {pretty(cue)}")
+
+        if observation.contexts:
+            st.markdown("**Environmental Context:**")
+            for ctx in observation.contexts:
+                st.markdown(f"- {pretty(ctx)}")
 
-    if st.session_state.analysis_done and len(st.session_state.selected_cues) > 0:
-        # Run analysis
-        report, conflicts = engine.analyze(
-            st.session_state.selected_cues,
-            st.session_state.selected_contexts
-        )
 
-        # Check for Dark Triad markers
-        dark_triad_detected = any(
-            profile in ["Psychopathy", "Narcissism", "Machiavellianism", 
-                       "Manipulator", "Dark_Persuasion", "Antisocial"]
-            for item in report for profile in [item["Profile"]]
-        )
+# Header
+st.markdown('<div class="main-header">🔍 THE SHERLOCK SYSTEM 🔍</div>', unsafe_allow_html=True)
+st.markdown('<div class="sub-header">"You see, but you do not observe." - Sherlock Holmes</div>', unsafe_allow_html=True)
 
-        # Display warning if Dark Triad detected
-        if dark_triad_detected:
-            st.markdown("""
-                <div class="warning-box">
-                    <h3>⚠️ CAUTION: HIGH MANIPULATION RISK DETECTED</h3>
-                    <p>Subject exhibits markers consistent with Dark Triad personality traits. 
-                    Exercise extreme caution in interactions. Verify all claims independently.</p>
-                </div>
-            """, unsafe_allow_html=True)
+# Create two columns for layout
+col1, col2 = st.columns([1, 1])
+
+with col1:
+    st.markdown("## 👤 Human Observation Interface")
+    observation_panel()
+
+    # Analyze button; its callback runs before this rerun renders the dashboard.
+    st.markdown("---")
+    st.button("🔬 ANALYZE SUBJECT", type="primary", use_container_width=True, on_click=start_analysis)
+
+with col2:
+    st.markdown("## 📊 Deduction Dashboard")
 
-        # Display incongruence findings
-        if conflicts:
-            st.markdown("### 🎯 Sherlock's Insights (Incongruence Analysis)")
-            for conflict in conflicts:
-                st.markdown(f"""
-                    <div class="insight-box">
-                        <strong>💡 {conflict}</strong>
-                    </div>
-                """, unsafe_allow_html=True)
-
-        # Display profile cards
-        st.markdown("### 🧩 Psychological Profile Analysis")
-
-        if report:
-            for idx, profile_data in enumerate(report[:8]):  # Top 8 profiles
-                profile = profile_data["Profile"]
-                score = profile_data["Probability_Score"]
-                confidence = profile_data["Confidence"]
-                threat = profile_data["Threat_Level"]
-
-                # Determine if this is a high-risk profile
-                is_danger = profile in [
-                    "Psychopathy", "Narcissism", "Machiavellianism", 
-                    "Deception", "Manipulator", "Hostility"
-                ] and confidence in ["High", "Very High", "Critical/Certain"]
-
-                card_class = "profile-card-danger" if is_danger else "profile-card"
-
-                # Confidence color
-                conf_class = {
-                    "Critical/Certain": "confidence-critical",
-                    "Very High": "confidence-critical",
-                    "High": "confidence-high",
-                    "Medium": "confidence-medium",
-                    "Low": "confidence-low"
-                }.get(confidence, "confidence-low")
-
-                # Threat indicator
-                threat_emoji = {
-                    "Extreme": "🔴",
-                    "High": "🟠",
-                    "Moderate": "🟡",
-                    "Low": "🟢",
-                    "Normal": "⚪"
-                }.get(threat, "⚪")
-
-                st.markdown(f"""
-                    <div class="{card_class}">
-                        <h4>{threat_emoji} {profile.replace('_', ' ')}</h4>
-                        <p><strong>Probability Score:</strong> {score}</p>
-                        <p><strong>Confidence:</strong> <span class="{conf_class}">{confidence}</span></p>
-                        <p><strong>Threat Assessment:</strong> {threat}</p>
-                    </div>
-                """, unsafe_allow_html=True)
-        else:
-            st.info("No significant profiles detected with current observations.")
-
-        # Observation summary
-        with st.expander("📝 Observation Summary", expanded=False):
-            st.markdown("**Selected Cues:**")
-            for cue in st.session_state.selected_cues:
-                st.markdown(f"- {cue.replace('_', ' ').title()}")
-
-            if st.session_state.selected_contexts:
-                st.markdown("**Environmental Context:**")
-                for ctx in st.session_state.selected_contexts:
-                    st.markdown(f"- {ctx.replace('_', ' ').title()}")
+    if st.session_state.analysis is not None:
+        # The Observation collapses cues picked under two body-part groups
+        observation = engine.observe(*st.session_state.analysis)
+        dashboard(observation)
+        observation_summary(observation)
 
         # Reset button
-        if st.button("🔄 New Analysis", use_container_width=True):
-            st.session_state.analysis_done = False
-            st.session_state.selected_cues = []
-            st.session_state.selected_contexts = []
-            st.rerun()
+        st.button("🔄 New Analysis", use_container_width=True, on_click=reset_analysis)
 
     else:
         st.info("👈 Select observable cues from the left panel and click 'ANALYZE SUBJECT' to generate a psychological profile.")
@@ -295,3 +373,4 @@ st.markdown("""
         </p>
     </div>
 """, unsafe_allow_html=True)
+st.caption(f"Rerun time: {(time.perf_counter() - RERUN_STARTED) * 1000:.1f} ms")
@@ -0,0 +1,241 @@
+"""Bulk runner: streams JSONL observation records through DeductionEngine.
+
+Each input line is a JSON object such as
+
+    {"id": "case-17", "cues": ["neck_pacifying_touch", ...], "contexts": ["job_interview"]}
+
+and produces one output line with the record id, the profile report and the
+incongruence findings (or, with --columnar, columnar result files; see
+sherlock_columnar). Records are read lazily and fanned out to a process pool
+in chunks; at most a fixed number of chunks is in flight, so memory stays
+bounded regardless of input size.
+
+Records may also carry free-text analyst notes under "text"; the cues and
+contexts resolved from them are added to any listed explicitly, each name
+counted once.
+
+    python sherlock_batch.py observations.jsonl -o results.jsonl --workers 8
+    cat observations.jsonl | python sherlock_batch.py - --unordered
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List, Optional, TextIO, Tuple
+
+from deduction_engine_enhanced import DeductionEngine
+
+# One engine per worker process, created by _init_worker.
+_engine = None
+_vectorized = False
+# Text resolver, built on the first record that carries notes.
+_resolver = None
+
+
+def _init_worker(vectorized: bool, library_path: Optional[str] = None):
+    global _engine, _vectorized
+    _engine = DeductionEngine(library_path=library_path)
+    _vectorized = vectorized
+
+
+def _parse_record(line_number: int, line: str) -> Dict:
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError as exc:
+        raise ValueError(f"line {line_number}: invalid JSON ({exc.msg})") from None
+    if not isinstance(record, dict):
+        raise ValueError(f"line {line_number}: expected a JSON object")
+    record.setdefault("id", line_number)
+    return record
+
+
+def _resolve_text(record: Dict) -> Dict:
+    """Merges cues and contexts resolved from the record's "text" notes"""
+    global _resolver
+    if _resolver is None:
+        from sherlock_text_resolver import CueResolver
+        _resolver = CueResolver(_engine)
+    matches = _resolver.resolve(record["text"])
+    cues = [m.name for m in matches if m.kind == "cue"]
+    contexts = [m.name for m in matches if m.kind == "context"]
+    # A name both listed and resolved from the notes counts once, as in an Observation.
+    record["cues"] = list(dict.fromkeys(list(record.get("cues", [])) + cues))
+    record["contexts"] = list(dict.fromkeys(list(record.get("contexts", [])) + contexts))
+    return record
+
+
+def _prepare_records(lines: List[Tuple[int, str]]) -> List[Dict]:
+    records = [_parse_record(line_number, line) for line_number, line in lines]
+    return [_resolve_text(record) if record.get("text") else record for record in records]
+
+
+def _score_chunk(lines: List[Tuple[int, str]]) -> List[str]:
+    """Parses, scores and serializes one chunk of input lines in a worker process"""
+    records = _prepare_records(lines)
+    observations = [record.get("cues", []) for record in records]
+    contexts = [record.get("contexts", []) for record in records]
+    if _vectorized:
+        outcomes = _engine.analyze_batch(observations, contexts)
+    else:
+        outcomes = [_engine.analyze(cues, ctx) for cues, ctx in zip(observations, contexts)]
+    return [
+        json.dumps({"id": record["id"], "report": [result.as_dict() for result in report],
+                    "conflicts": conflicts})
+        for record, (report, conflicts) in zip(records, outcomes)
+    ]
+
+
+def _score_chunk_columns(lines: List[Tuple[int, str]]) -> List:
+    """Parses and scores one chunk of input lines into a single ColumnarChunk"""
+    from sherlock_columnar import score_columns
+
+    records = _prepare_records(lines)
+    return [score_columns(_engine, [record.get("cues", []) for record in records],
+                          [record.get("contexts", []) for record in records],
+                          [record["id"] for record in records])]
+
+
+def read_lines(stream: TextIO) -> Iterator[Tuple[int, str]]:
+    """Yields (line number, text) for each non-blank line of a JSONL stream"""
+    for line_number, line in enumerate(stream, 1):
+        if line.strip():
+            yield line_number, line
+
+
+def chunked(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class ThroughputReporter:
+    """Prints records/sec to a stream at most once per interval"""
+
+    def __init__(self, stream: TextIO, interval: float = 2.0):
+        self.stream = stream
+        self.interval = interval
+        self.count = 0
+        self.started = time.perf_counter()
+        self._last = self.started
+
+    def update(self, n: int):
+        self.count += n
+        now = time.perf_counter()
+        if self.interval > 0 and now - self._last >= self.interval:
+            self._last = now
+            self._report(now)
+
+    def finish(self):
+        self._report(time.perf_counter(), final=True)
+
+    def _report(self, now: float, final: bool = False):
+        elapsed = max(now - self.started, 1e-9)
+        label = "done" if final else "progress"
+        self.stream.write(f"[{label}] {self.count} records in {elapsed:.1f}s "
+                          f"({self.count / elapsed:,.0f} records/s)\n")
+        self.stream.flush()
+
+
+def run(lines: Iterable[Tuple[int, str]], workers: int = 1, chunk_size: int = 1000,
+        ordered: bool = True, vectorized: bool = False, max_pending: Optional[int] = None,
+        library_path: Optional[str] = None, columnar: bool = False) -> Iterator:
+    """Scores numbered JSONL lines and yields serialized results.
+
+    Input order is kept unless ordered is False. With more than one worker, at
+    most max_pending chunks (default: two per worker) are in flight at a time.
+    With columnar=True, one sherlock_columnar.ColumnarChunk is yielded per
+    chunk instead of JSON lines.
+    """
+    chunks = chunked(lines, chunk_size)
+    task = _score_chunk_columns if columnar else _score_chunk
+    if workers <= 1:
+        _init_worker(vectorized, library_path)
+        for chunk in chunks:
+            yield from task(chunk)
+        return
+
+    max_pending = max_pending or workers * 2
+    with ProcessPoolExecutor(workers, initializer=_init_worker,
+                             initargs=(vectorized, library_path)) as pool:
+        pending = deque() if ordered else set()
+        for chunk in chunks:
+            future = pool.submit(task, chunk)
+            if ordered:
+                pending.append(future)
+            else:
+                pending.add(future)
+            if len(pending) >= max_pending:
+                yield from _drain(pending, ordered)
+        while pending:
+            yield from _drain(pending, ordered)
+
+
+def _drain(pending, ordered: bool) -> Iterator[str]:
+    """Waits for the next chunk (oldest if ordered, else first finished) and yields its results"""
+    if ordered:
+        yield from pending.popleft().result()
+        return
+    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+    for future in done:
+        pending.discard(future)
+        yield from future.result()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Score JSONL observation records in bulk.")
+    parser.add_argument("input", help="JSONL file of observation records, or - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="output JSONL file (default: stdout)")
+    parser.add_argument("-w", "--workers", type=int, default=os.cpu_count() or 1,
+                        help="worker processes (default: CPU count)")
+    parser.add_argument("-c", "--chunk-size", type=int, default=1000, help="records per work unit")
+    parser.add_argument("--unordered", action="store_true",
+                        help="emit results as chunks finish instead of in input order")
+    parser.add_argument("--vectorized", action="store_true",
+                        help="score chunks with analyze_batch (requires numpy)")
+    parser.add_argument("--library", help="JSON or compiled cue library file (default: built-in)")
+    parser.add_argument("--columnar", metavar="DIR",
+                        help="write results as columnar .npy files to DIR instead of JSONL (requires numpy)")
+    parser.add_argument("--progress-interval", type=float, default=2.0,
+                        help="seconds between throughput reports on stderr (0 disables)")
+    args = parser.parse_args(argv)
+
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    if args.columnar:
+        from sherlock_columnar import ColumnarWriter
+        sink = ColumnarWriter(args.columnar, DeductionEngine(library_path=args.library))
+    else:
+        sink = sys.stdout if args.output == "-" else open(args.output, "w", encoding="utf-8")
+    reporter = ThroughputReporter(sys.stderr, args.progress_interval)
+    try:
+        results = run(read_lines(source), workers=args.workers, chunk_size=args.chunk_size,
+                      ordered=not args.unordered, vectorized=args.vectorized,
+                      library_path=args.library, columnar=bool(args.columnar))
+        for result in results:
+            if args.columnar:
+                sink.append(result)
+                reporter.update(len(result.row_counts))
+            else:
+                sink.write(result)
+                sink.write("\n")
+                reporter.update(1)
+    except ValueError as exc:
+        parser.exit(2, f"error: {exc}\n")
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        if sink is not sys.stdout:
+            sink.close()
+    reporter.finish()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
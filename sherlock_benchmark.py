@@ -0,0 +1,335 @@
+"""Reproducible benchmarks for DeductionEngine on synthetic workloads.
+
+A WorkloadSpec describes a synthetic cue library (cues, profiles, profiles per
+cue, contexts, incongruence rules) and the observation stream run against it
+(cues and contexts per observation, share of observations with a context).
+Everything is drawn from a seeded random.Random, so the same spec always
+produces the same library and observations.
+
+Each benchmark records throughput, per-call latency percentiles and peak
+traced memory. Every benchmark is warmed up first and timed over several
+passes; throughput is taken from the fastest pass, so one-off stalls do not
+show up as regressions. The analyze_batch benchmarks are also reported as a
+speedup over calling analyze once per observation. Results are written as
+JSON baselines; --compare reports any benchmark whose throughput dropped by
+more than the tolerance and exits 1.
+
+    python sherlock_benchmark.py --scales small,medium,large -o baseline.json
+    python sherlock_benchmark.py --scales medium --sweep cues_per_observation=2,8,32
+    python sherlock_benchmark.py --compare baseline.json --tolerance 0.15
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import namedtuple
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from deduction_engine_enhanced import SCORING_CATEGORIES, DeductionEngine, np
+
+WorkloadSpec = namedtuple("WorkloadSpec", [
+    "cues", "profiles", "profiles_per_cue", "contexts", "rules",
+    "cues_per_observation", "contexts_per_observation", "context_rate", "seed",
+])
+
+SCALES = {
+    "small": WorkloadSpec(60, 25, 4, 6, 6, 6, 1, 0.5, 7),
+    "medium": WorkloadSpec(1000, 200, 8, 40, 100, 12, 2, 0.5, 7),
+    "large": WorkloadSpec(20000, 2000, 16, 200, 2000, 24, 2, 0.5, 7),
+}
+
+# Benchmark result: one row of a baseline file.
+BenchResult = namedtuple("BenchResult", [
+    "scale", "benchmark", "calls", "ops_per_sec", "p50_us", "p90_us", "p99_us", "peak_kib",
+])
+
+
+def generate_library(spec: WorkloadSpec) -> Tuple[Dict, List[Dict]]:
+    """Builds a synthetic (cue_library, incongruence_rules) pair for spec"""
+    rng = random.Random(spec.seed)
+    profiles = [f"PROFILE_{i:05d}" for i in range(spec.profiles)]
+    library = {category: {} for category in SCORING_CATEGORIES}
+    for i in range(spec.cues):
+        category = SCORING_CATEGORIES[i % len(SCORING_CATEGORIES)]
+        chosen = rng.sample(profiles, min(spec.profiles_per_cue, spec.profiles))
+        library[category][f"cue_{i:06d}"] = {profile: rng.randint(1, 10) for profile in chosen}
+    library["CONTEXT_FILTERS"] = {
+        f"context_{i:04d}": {profile: rng.choice((-6, -4, -2, 2, 4))
+                             for profile in rng.sample(profiles, min(spec.profiles_per_cue, spec.profiles))}
+        for i in range(spec.contexts)
+    }
+
+    cues = [f"cue_{i:06d}" for i in range(spec.cues)]
+    rules = []
+    for i in range(spec.rules):
+        rule = {"all_of": rng.sample(cues, 2), "message": f"SYNTHETIC RULE {i}"}
+        if i % 3 == 1:
+            rule["any_of"] = rng.sample(cues, 3)
+        elif i % 3 == 2:
+            rule["none_of"] = rng.sample(cues, 1)
+        rules.append(rule)
+    return library, rules
+
+
+def generate_observations(spec: WorkloadSpec, count: int) -> List[Tuple[List[str], List[str]]]:
+    """Builds count (cues, contexts) observations drawn from spec's library"""
+    rng = random.Random(spec.seed + 1)
+    cues = [f"cue_{i:06d}" for i in range(spec.cues)]
+    contexts = [f"context_{i:04d}" for i in range(spec.contexts)]
+    observations = []
+    for _ in range(count):
+        observed = rng.sample(cues, min(spec.cues_per_observation, len(cues)))
+        environment = []
+        if contexts and rng.random() < spec.context_rate:
+            environment = rng.sample(contexts, min(spec.contexts_per_observation, len(contexts)))
+        observations.append((observed, environment))
+    return observations
+
+
+def synthetic_engine(spec: WorkloadSpec, **engine_options) -> DeductionEngine:
+    library, rules = generate_library(spec)
+    engine = DeductionEngine(**engine_options)
+    engine.cue_library = library
+    engine.incongruence_rules = rules
+    return engine
+
+
+def _percentile(sorted_samples: List[float], q: float) -> float:
+    return sorted_samples[min(len(sorted_samples) - 1, int(q * len(sorted_samples)))]
+
+
+def measure(scale: str, name: str, call: Callable, args: Sequence, memory_sample: int = 200,
+            passes: int = 5, min_time: float = 0.5, warmup: int = 50, inner: int = 1) -> BenchResult:
+    """Times call(arg) for every arg, then reruns a sample under tracemalloc for peak memory.
+
+    The first warmup args are run untimed, then all args are timed at least
+    passes times and until min_time seconds have gone by. Throughput comes
+    from the fastest pass and latency percentiles from all passes. Calls too
+    fast to time one by one are repeated inner times per timer reading.
+    """
+    timer = time.perf_counter
+    for arg in args[:warmup]:
+        call(arg)
+
+    latencies = []
+    best = float("inf")
+    repeat = range(inner)
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        deadline = timer() + min_time
+        done = 0
+        while done < passes or timer() < deadline:
+            started = timer()
+            for arg in args:
+                t0 = timer()
+                for _ in repeat:
+                    call(arg)
+                latencies.append((timer() - t0) / inner)
+            best = min(best, timer() - started)
+            done += 1
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    tracemalloc.start()
+    try:
+        for arg in args[:memory_sample]:
+            call(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    calls = len(args) * inner
+    return BenchResult(
+        scale, name, calls, round(calls / max(best, 1e-12), 1),
+        round(_percentile(latencies, 0.50) * 1e6, 2), round(_percentile(latencies, 0.90) * 1e6, 2),
+        round(_percentile(latencies, 0.99) * 1e6, 2), round(peak / 1024, 1),
+    )
+
+
+def run_common(init_repeats: int = 10) -> List[BenchResult]:
+    """Benchmarks that do not depend on the workload, reported once under scale "all" """
+    return [measure("all", "init_builtin", lambda _: DeductionEngine(), [None], passes=init_repeats, warmup=1)]
+
+
+def run_scale(scale: str, spec: WorkloadSpec, observations: int = 5000, batch_size: int = 1024,
+              init_repeats: int = 10) -> List[BenchResult]:
+    """Runs every workload-dependent benchmark against one workload spec"""
+    from sherlock_library_store import compile_library, write_source
+
+    library, rules = generate_library(spec)
+    stream = generate_observations(spec, observations)
+    results = []
+
+    with tempfile.TemporaryDirectory() as workdir:
+        source = os.path.join(workdir, "library.json")
+        compiled = os.path.join(workdir, "library.shlib")
+        write_source(source, f"synthetic-{scale}", library, rules)
+        compile_library(source, compiled)
+        # One construction per pass: throughput is that of the fastest construction.
+        results.append(measure(scale, "init_json", lambda _: DeductionEngine(library_path=source), [None],
+                               passes=init_repeats, warmup=1))
+        results.append(measure(scale, "init_compiled", lambda _: DeductionEngine(library_path=compiled), [None],
+                               passes=init_repeats, warmup=1))
+
+    engine = synthetic_engine(spec)
+    cue_lists = [cues for cues, _ in stream]
+    results.append(measure(scale, "analyze", lambda obs: engine.analyze(*obs), stream))
+    results.append(measure(scale, "analyze_top5", lambda obs: engine.analyze(*obs, top_k=5), stream))
+    results.append(measure(scale, "detect_incongruence", engine.detect_incongruence, cue_lists))
+    observed = [engine.observe(cues, contexts) for cues, contexts in stream]
+    results.append(measure(scale, "analyze_observation", engine.analyze, observed))
+
+    if np is not None:
+        batches = [stream[i:i + batch_size] for i in range(0, len(stream), batch_size)]
+
+        def score_batch(batch, top_k=None):
+            engine.analyze_batch([cues for cues, _ in batch], [contexts for _, contexts in batch], top_k=top_k)
+
+        for name, top_k in (("analyze_batch", None), ("analyze_batch_top5", 5)):
+            batch_result = measure(scale, name, lambda batch: score_batch(batch, top_k), batches,
+                                   memory_sample=2, warmup=1)
+            # Throughput is per observation so it compares with analyze; latency stays per batch.
+            results.append(batch_result._replace(
+                calls=len(stream), ops_per_sec=round(len(stream) / len(batches) * batch_result.ops_per_sec, 1)))
+
+    # Helpers the Streamlit page calls to build its cue and context pickers; each
+    # takes well under a microsecond on small libraries, so they are timed in loops.
+    helper_calls = [None] * 200
+    results.append(measure(scale, "ui_cues_by_category", lambda _: engine.get_all_cues_by_category(), helper_calls,
+                           inner=50))
+    results.append(measure(scale, "ui_context_options", lambda _: engine.get_context_options(), helper_calls,
+                           inner=50))
+    return results
+
+
+def environment() -> Dict:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "numpy": getattr(np, "__version__", None),
+        "machine": platform.machine(),
+        "system": platform.system(),
+        "cpu_count": os.cpu_count(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+def save_baseline(path: str, results: List[BenchResult], specs: Dict[str, WorkloadSpec]):
+    document = {
+        "environment": environment(),
+        "specs": {scale: spec._asdict() for scale, spec in specs.items()},
+        "results": [result._asdict() for result in results],
+    }
+    with open(path, "w", encoding="utf-8") as handle:
+        json.dump(document, handle, indent=2)
+        handle.write("\n")
+
+
+def load_baseline(path: str) -> List[BenchResult]:
+    with open(path, encoding="utf-8") as handle:
+        document = json.load(handle)
+    return [BenchResult(**row) for row in document["results"]]
+
+
+def compare(baseline: List[BenchResult], current: List[BenchResult], tolerance: float = 0.1) -> List[str]:
+    """Lists benchmarks whose throughput fell more than tolerance below the baseline"""
+    previous = {(result.scale, result.benchmark): result for result in baseline}
+    regressions = []
+    for result in current:
+        before = previous.get((result.scale, result.benchmark))
+        if before is None or before.ops_per_sec <= 0:
+            continue
+        change = result.ops_per_sec / before.ops_per_sec - 1
+        if change < -tolerance:
+            regressions.append(f"{result.scale}/{result.benchmark}: {before.ops_per_sec:,.0f} -> "
+                               f"{result.ops_per_sec:,.0f} ops/s ({change:+.1%})")
+    return regressions
+
+
+def format_table(results: List[BenchResult]) -> str:
+    width = max([len("scale")] + [len(r.scale) for r in results])
+    header = f"{'scale':<{width}} {'benchmark':<22} {'ops/s':>12} {'p50 us':>10} {'p90 us':>10} {'p99 us':>10} {'peak KiB':>10}"
+    lines = [header, "-" * len(header)]
+    for r in results:
+        lines.append(f"{r.scale:<{width}} {r.benchmark:<22} {r.ops_per_sec:>12,.0f} {r.p50_us:>10.1f} "
+                     f"{r.p90_us:>10.1f} {r.p99_us:>10.1f} {r.peak_kib:>10.1f}")
+    return "\n".join(lines)
+
+
+def batch_speedups(results: List[BenchResult]) -> List[str]:
+    """Throughput of each analyze_batch benchmark relative to its per-observation analyze counterpart"""
+    by_key = {(result.scale, result.benchmark): result for result in results}
+    lines = []
+    for (scale, name), result in by_key.items():
+        if not name.startswith("analyze_batch"):
+            continue
+        single = by_key.get((scale, "analyze" + name[len("analyze_batch"):]))
+        if single is not None and single.ops_per_sec > 0:
+            lines.append(f"{scale}/{name}: {result.ops_per_sec / single.ops_per_sec:.2f}x {single.benchmark}")
+    return lines
+
+
+def _parse_sweep(text: str) -> Tuple[str, List[float]]:
+    field, _, values = text.partition("=")
+    if field not in WorkloadSpec._fields or not values:
+        raise argparse.ArgumentTypeError(f"expected FIELD=V1,V2,... with FIELD one of {', '.join(WorkloadSpec._fields)}")
+    cast = float if field == "context_rate" else int
+    return field, [cast(value) for value in values.split(",")]
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark DeductionEngine on synthetic workloads.")
+    parser.add_argument("--scales", default="small,medium", help=f"comma-separated presets ({', '.join(SCALES)})")
+    parser.add_argument("--sweep", type=_parse_sweep,
+                        help="vary one spec field across values for each scale, e.g. cues_per_observation=2,8,32")
+    parser.add_argument("--seed", type=int, help="override the workload seed")
+    parser.add_argument("-n", "--observations", type=int, default=5000, help="observations per benchmark")
+    parser.add_argument("-o", "--output", help="write results as a JSON baseline")
+    parser.add_argument("--compare", help="baseline JSON to check for throughput regressions")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="allowed throughput drop for --compare")
+    args = parser.parse_args(argv)
+
+    specs = {}
+    for scale in args.scales.split(","):
+        if scale not in SCALES:
+            parser.error(f"unknown scale {scale!r}")
+        spec = SCALES[scale] if args.seed is None else SCALES[scale]._replace(seed=args.seed)
+        if args.sweep is None:
+            specs[scale] = spec
+        else:
+            field, values = args.sweep
+            for value in values:
+                specs[f"{scale}:{field}={value}"] = spec._replace(**{field: value})
+
+    results = run_common()
+    for scale, spec in specs.items():
+        results.extend(run_scale(scale, spec, observations=args.observations))
+        sys.stderr.write(f"finished {scale}\n")
+    print(format_table(results))
+    for line in batch_speedups(results):
+        print(f"SPEEDUP {line}")
+
+    if args.output:
+        save_baseline(args.output, results, specs)
+    if args.compare:
+        regressions = compare(load_baseline(args.compare), results, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,274 @@
+"""Nearest-neighbour retrieval of past cases by profile-score similarity.
+
+Each stored case is an analyze() result turned into an L2-normalized vector
+over a fixed profile list, plus the case's cues, contexts and conflicts.
+Similarity is the cosine between score vectors, so a query for a new
+analysis returns the past cases whose profile mix looks most alike.
+
+Vectors live in fixed-size float32 shards. query() scans every shard with
+one matrix-vector product each (exact search). For large stores,
+build_index() clusters the vectors with spherical k-means into an inverted
+file index; query(..., nprobe=n) then scans only the n clusters closest to
+the query (approximate search), plus any cases added since the index was
+built.
+
+    store = CaseStore.for_engine(engine)
+    report, conflicts = engine.analyze(cues, contexts)
+    matches = store.query(report, k=5)
+    store.add(report, cues, contexts, conflicts, case_id="case-17")
+    store.save("cases.store")
+    store = CaseStore.load("cases.store")   # shards are memory-mapped
+"""
+
+import json
+import os
+from collections import namedtuple
+from typing import Dict, Hashable, List, Optional, Sequence, Union
+
+from deduction_engine_enhanced import DeductionEngine, ProfileResult, np
+
+FORMAT = "sherlock-cases/1"
+
+# One retrieved case; similarity is the cosine between score vectors.
+CaseMatch = namedtuple("CaseMatch", ["case_id", "similarity", "cues", "contexts", "conflicts"])
+
+
+def _write_json(path: str, document):
+    temp_path = path + ".tmp"
+    with open(temp_path, "w", encoding="utf-8") as handle:
+        json.dump(document, handle)
+    os.replace(temp_path, path)
+
+
+def _save_array(path: str, array):
+    temp_path = path + ".tmp.npy"
+    np.save(temp_path, array)
+    os.replace(temp_path, path)
+
+
+class CaseStore:
+    """Archive of analyzed cases answering k-nearest-neighbour queries"""
+
+    def __init__(self, profiles: Sequence[str], shard_size: int = 65536):
+        if np is None:
+            raise ImportError("CaseStore requires numpy")
+        self.profiles = list(profiles)
+        self.profile_ids = {profile: i for i, profile in enumerate(self.profiles)}
+        self.shard_size = shard_size
+        self._shards: List["np.ndarray"] = []
+        # Per case: (case id, cues, contexts, conflicts)
+        self._cases: List[tuple] = []
+        self._case_rows: Dict[Hashable, int] = {}
+        # Inverted file index from build_index(): centroids, cluster -> rows (CSR) and the rows it covers.
+        self._centroids = None
+        self._list_ptr = None
+        self._list_rows = None
+        self._indexed = 0
+
+    @classmethod
+    def for_engine(cls, engine: DeductionEngine, shard_size: int = 65536) -> "CaseStore":
+        """Creates a store over the profiles of the engine's current library"""
+        return cls(engine.profile_names, shard_size)
+
+    def __len__(self) -> int:
+        return len(self._cases)
+
+    # --- Vectors ---
+    def vector(self, report: Union[List[ProfileResult], Dict[str, float]]) -> "np.ndarray":
+        """L2-normalized score vector of a report; profiles unknown to the store are ignored"""
+        vector = np.zeros(len(self.profiles), dtype=np.float32)
+        items = report.items() if isinstance(report, dict) else ((item[0], item[1]) for item in report)
+        for profile, score in items:
+            i = self.profile_ids.get(profile)
+            if i is not None:
+                vector[i] = score
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+    def _writable_tail(self) -> "np.ndarray":
+        """The shard the next case goes into, allocated or copied out of its memory map if needed"""
+        shard = len(self._cases) // self.shard_size
+        if shard == len(self._shards):
+            self._shards.append(np.zeros((self.shard_size, len(self.profiles)), dtype=np.float32))
+        elif not self._shards[shard].flags.writeable:
+            self._shards[shard] = np.array(self._shards[shard])
+        return self._shards[shard]
+
+    # --- Adding ---
+    def add(self, report: Union[List[ProfileResult], Dict[str, float]], cues: Sequence[str] = (),
+            contexts: Sequence[str] = (), conflicts: Sequence[str] = (),
+            case_id: Optional[Hashable] = None) -> Hashable:
+        """Stores one analyzed case and returns its id (by default its row number)"""
+        row = len(self._cases)
+        case_id = row if case_id is None else case_id
+        if case_id in self._case_rows:
+            raise ValueError(f"case {case_id!r} is already stored")
+        tail = self._writable_tail()
+        tail[row % self.shard_size] = self.vector(report)
+        self._cases.append((case_id, tuple(cues), tuple(contexts), tuple(conflicts)))
+        self._case_rows[case_id] = row
+        return case_id
+
+    def add_analysis(self, engine: DeductionEngine, cues: Sequence[str], contexts: Sequence[str] = (),
+                     case_id: Optional[Hashable] = None) -> Hashable:
+        report, conflicts = engine.analyze(list(cues), list(contexts))
+        return self.add(report, cues, contexts, conflicts, case_id)
+
+    # --- Querying ---
+    def _match(self, row: int, similarity: float) -> CaseMatch:
+        case_id, cues, contexts, conflicts = self._cases[row]
+        return CaseMatch(case_id, similarity, cues, contexts, conflicts)
+
+    @staticmethod
+    def _top(rows: "np.ndarray", similarities: "np.ndarray", k: int):
+        if len(rows) > k:
+            keep = np.argpartition(-similarities, k - 1)[:k]
+            rows, similarities = rows[keep], similarities[keep]
+        # Highest similarity first, earlier cases first on ties.
+        order = np.lexsort((rows, -similarities))
+        return rows[order], similarities[order]
+
+    def _scan(self, query: "np.ndarray", start: int, stop: int, k: int):
+        """Exact top k over rows start:stop, one matrix-vector product per shard"""
+        best_rows, best_sims = [], []
+        for shard_no in range(start // self.shard_size, -(-stop // self.shard_size)):
+            lo = max(start, shard_no * self.shard_size)
+            hi = min(stop, (shard_no + 1) * self.shard_size)
+            block = self._shards[shard_no][lo - shard_no * self.shard_size:hi - shard_no * self.shard_size]
+            rows, sims = self._top(np.arange(lo, hi), block @ query, k)
+            best_rows.append(rows)
+            best_sims.append(sims)
+        if not best_rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        return np.concatenate(best_rows), np.concatenate(best_sims)
+
+    def _gather(self, rows: "np.ndarray") -> "np.ndarray":
+        vectors = np.empty((len(rows), len(self.profiles)), dtype=np.float32)
+        shards, offsets = np.divmod(rows, self.shard_size)
+        for shard_no in np.unique(shards):
+            selected = shards == shard_no
+            vectors[selected] = self._shards[shard_no][offsets[selected]]
+        return vectors
+
+    def query(self, report: Union[List[ProfileResult], Dict[str, float], "np.ndarray"], k: int = 5,
+              nprobe: Optional[int] = None, min_similarity: Optional[float] = None) -> List[CaseMatch]:
+        """Returns the k stored cases most similar to report, most similar first.
+
+        report may also be a vector from vector(). With nprobe and an index
+        from build_index(), only the nprobe nearest clusters are searched. A
+        report with no score on any stored profile matches nothing.
+        """
+        query = report if isinstance(report, np.ndarray) else self.vector(report)
+        n = len(self._cases)
+        # An all-zero query is equally similar (0) to every case; ranking those would be arbitrary.
+        if n == 0 or k <= 0 or not np.any(query):
+            return []
+
+        if nprobe is None or self._centroids is None:
+            rows, sims = self._scan(query, 0, n, k)
+        else:
+            probes = np.argsort(-(self._centroids @ query), kind="stable")[:nprobe]
+            candidates = np.concatenate([self._list_rows[self._list_ptr[c]:self._list_ptr[c + 1]]
+                                         for c in probes])
+            rows, sims = [candidates], [self._gather(candidates) @ query]
+            # Cases added after build_index() are not clustered yet; scan them exactly.
+            recent_rows, recent_sims = self._scan(query, self._indexed, n, k)
+            rows, sims = np.concatenate(rows + [recent_rows]), np.concatenate(sims + [recent_sims])
+
+        rows, sims = self._top(rows, sims, k)
+        matches = [self._match(int(row), float(sim)) for row, sim in zip(rows, sims)]
+        if min_similarity is not None:
+            matches = [match for match in matches if match.similarity >= min_similarity]
+        return matches
+
+    # --- Approximate index ---
+    def build_index(self, nlist: Optional[int] = None, iterations: int = 10, sample: int = 100000,
+                    seed: int = 0, block: int = 65536):
+        """Clusters the stored vectors with spherical k-means into nlist inverted lists"""
+        n = len(self._cases)
+        if n == 0:
+            return
+        nlist = min(n, nlist or max(1, int(np.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        training = self._gather(np.sort(rng.choice(n, min(n, sample), replace=False)))
+        centroids = training[rng.choice(len(training), nlist, replace=False)].copy()
+
+        for _ in range(iterations):
+            assignment = np.argmax(training @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, training)
+            norms = np.linalg.norm(sums, axis=1)
+            empty = norms == 0
+            # Re-seed empty clusters from random training vectors.
+            sums[empty] = training[rng.choice(len(training), int(empty.sum()))]
+            norms[empty] = np.maximum(np.linalg.norm(sums[empty], axis=1), 1e-12)
+            centroids = sums / norms[:, None]
+
+        assignment = np.empty(n, dtype=np.int64)
+        for start in range(0, n, block):
+            rows = np.arange(start, min(n, start + block))
+            assignment[start:start + len(rows)] = np.argmax(self._gather(rows) @ centroids.T, axis=1)
+        self._centroids = centroids.astype(np.float32)
+        self._list_rows = np.argsort(assignment, kind="stable")
+        self._list_ptr = np.searchsorted(assignment[self._list_rows], np.arange(nlist + 1))
+        self._indexed = n
+
+    # --- Persistence ---
+    def save(self, path: str):
+        """Writes the store to directory path; case ids must be JSON-serializable.
+
+        Shards still memory-mapped from that directory are not rewritten.
+        """
+        os.makedirs(path, exist_ok=True)
+        n = len(self._cases)
+        for shard_no, shard in enumerate(self._shards):
+            rows = min(self.shard_size, n - shard_no * self.shard_size)
+            shard_path = os.path.join(path, f"shard_{shard_no:05d}.npy")
+            if isinstance(shard, np.memmap) and shard.filename == os.path.abspath(shard_path):
+                continue  # still the mapped, unmodified file
+            _save_array(shard_path, shard[:rows])
+        with open(os.path.join(path, "cases.jsonl.tmp"), "w", encoding="utf-8") as handle:
+            for case_id, cues, contexts, conflicts in self._cases:
+                handle.write(json.dumps({"id": case_id, "cues": cues, "contexts": contexts,
+                                         "conflicts": conflicts}))
+                handle.write("\n")
+        os.replace(os.path.join(path, "cases.jsonl.tmp"), os.path.join(path, "cases.jsonl"))
+        if self._centroids is not None:
+            _save_array(os.path.join(path, "centroids.npy"), self._centroids)
+            _save_array(os.path.join(path, "list_ptr.npy"), self._list_ptr)
+            _save_array(os.path.join(path, "list_rows.npy"), self._list_rows)
+        _write_json(os.path.join(path, "meta.json"), {
+            "format": FORMAT, "profiles": self.profiles, "shard_size": self.shard_size,
+            "cases": n, "shards": len(self._shards),
+            "indexed": self._indexed if self._centroids is not None else 0,
+        })
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "CaseStore":
+        """Opens a saved store; with mmap, shard files are mapped read-only until written to"""
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as handle:
+            meta = json.load(handle)
+        if meta.get("format") != FORMAT:
+            raise ValueError(f"{path}: not a {FORMAT} store")
+        store = cls(meta["profiles"], meta["shard_size"])
+        mode = "r" if mmap else None
+        for shard_no in range(meta["shards"]):
+            shard = np.load(os.path.join(path, f"shard_{shard_no:05d}.npy"), mmap_mode=mode)
+            if len(shard) < store.shard_size:
+                # A partial last shard is padded back to full size so new cases can be appended.
+                padded = np.zeros((store.shard_size, len(store.profiles)), dtype=np.float32)
+                padded[:len(shard)] = shard
+                shard = padded
+            store._shards.append(shard)
+        with open(os.path.join(path, "cases.jsonl"), encoding="utf-8") as handle:
+            for row, line in enumerate(handle):
+                case = json.loads(line)
+                store._cases.append((case["id"], tuple(case["cues"]), tuple(case["contexts"]),
+                                     tuple(case["conflicts"])))
+                store._case_rows[case["id"]] = row
+        if meta["indexed"]:
+            store._centroids = np.load(os.path.join(path, "centroids.npy"))
+            store._list_ptr = np.load(os.path.join(path, "list_ptr.npy"))
+            store._list_rows = np.load(os.path.join(path, "list_rows.npy"))
+            store._indexed = meta["indexed"]
+        return store
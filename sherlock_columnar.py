@@ -0,0 +1,278 @@
+"""Columnar bulk export of analysis results.
+
+Instead of one dict per ranked profile, a result set is written as a
+directory of .npy column files plus a meta.json dictionary:
+
+    row_ptr.npy    int64 [rows + 1]   record i owns ranked entries row_ptr[i]:row_ptr[i + 1]
+    profile.npy    int32 [entries]    profile id, an index into meta["profiles"]
+    score.npy      int64/float64      profile score
+    grade.npy      int8  [entries]    grade id, an index into meta["grades"]
+    rule_ptr.npy   int64 [rows + 1]   record i fired rules rule_ptr[i]:rule_ptr[i + 1]
+    rule.npy       int32 [fired]      rule id, an index into meta["rules"]
+    id_ptr.npy     int64 [rows + 1]   record i's id is id_bytes[id_ptr[i]:id_ptr[i + 1]]
+    id_bytes.npy   uint8 [id bytes]   UTF-8 record ids, back to back (only if ids were given)
+
+Entries are in report order, so a record's slice is exactly its analyze()
+report. Profile, rule and grade names are stored once in meta.json. Columns
+are appended chunk by chunk and their .npy headers patched on close, so
+writing never holds the whole result set. ColumnarResults maps the columns
+back read-only with numpy.memmap.
+
+    with ColumnarWriter("results.cols", engine) as writer:
+        writer.write(observations, contexts, ids)
+    results = ColumnarResults("results.cols")
+    scores = results.score_matrix()
+"""
+
+import json
+import os
+from collections import namedtuple
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from deduction_engine_enhanced import DeductionEngine, ProfileResult, np
+
+FORMAT = "sherlock-columnar/1"
+_MAGIC = b"\x93NUMPY\x01\x00"
+# Fixed .npy header size, so the shape can be patched in place on close.
+_HEADER_BYTES = 128
+
+# One chunk of results in columnar form; row_counts/rule_counts are per record.
+ColumnarChunk = namedtuple("ColumnarChunk", ["row_counts", "profile", "score", "grade",
+                                             "rule_counts", "rule", "ids"])
+
+
+def score_columns(engine: DeductionEngine, observations: Sequence, contexts: Optional[Sequence] = None,
+                  ids: Optional[Sequence] = None, top_k: Optional[int] = None,
+                  min_score: Optional[float] = None) -> ColumnarChunk:
+    """Scores records straight into columns, without building ProfileResults"""
+    if np is None:
+        raise ImportError("columnar export requires numpy")
+    if contexts is None:
+        contexts = [getattr(obs, "contexts", ()) for obs in observations]
+    elif len(contexts) != len(observations):
+        raise ValueError("observations and contexts must have the same length")
+    if ids is not None and len(ids) != len(observations):
+        raise ValueError("observations and ids must have the same length")
+
+    bounds, pids, scores, grades = engine.rank_arrays(observations, contexts, top_k, min_score)
+    row_counts = np.diff(bounds)
+
+    fired = [engine.matching_rule_ids(cues) for cues in observations]
+    return ColumnarChunk(
+        row_counts.astype(np.int64), pids.astype(np.int32), scores, grades.astype(np.int8),
+        np.array([len(rule_ids) for rule_ids in fired], dtype=np.int64),
+        np.array([rule_id for rule_ids in fired for rule_id in rule_ids], dtype=np.int32),
+        None if ids is None else [str(record_id) for record_id in ids],
+    )
+
+
+class _ColumnFile:
+    """Appends raw values to a .npy file whose header is finalized on close"""
+
+    def __init__(self, path: str, dtype):
+        self.path = path
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self._handle = open(path, "wb")
+        self._handle.write(b"\0" * _HEADER_BYTES)
+
+    def append(self, values):
+        values = np.ascontiguousarray(values, dtype=self.dtype)
+        self._handle.write(values.tobytes())
+        self.count += len(values)
+
+    def close(self):
+        header = repr({"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False,
+                       "shape": (self.count,)}).encode("latin1")
+        room = _HEADER_BYTES - len(_MAGIC) - 2
+        header = header.ljust(room - 1) + b"\n"
+        if len(header) > room:
+            raise ValueError("column header does not fit")
+        self._handle.seek(0)
+        self._handle.write(_MAGIC + len(header).to_bytes(2, "little") + header)
+        self._handle.close()
+
+
+class ColumnarWriter:
+    """Writes analysis results for many records to a columnar result directory"""
+
+    def __init__(self, path: str, engine: DeductionEngine, top_k: Optional[int] = None,
+                 min_score: Optional[float] = None):
+        if np is None:
+            raise ImportError("columnar export requires numpy")
+        os.makedirs(path, exist_ok=True)
+        self.path = path
+        self.engine = engine
+        self.top_k = top_k
+        self.min_score = min_score
+        self.rows = 0
+        # Names are taken from the library in use when the writer opens.
+        self._generation = (engine.library_generation, engine.rules_generation)
+        self._profiles = engine.profile_names
+        self._rules = engine.rule_messages
+        integral = engine.integral_weights
+        self._entries = 0
+        self._fired = 0
+        self._columns = {
+            "row_ptr": _ColumnFile(os.path.join(path, "row_ptr.npy"), np.int64),
+            "profile": _ColumnFile(os.path.join(path, "profile.npy"), np.int32),
+            "score": _ColumnFile(os.path.join(path, "score.npy"), np.int64 if integral else np.float64),
+            "grade": _ColumnFile(os.path.join(path, "grade.npy"), np.int8),
+            "rule_ptr": _ColumnFile(os.path.join(path, "rule_ptr.npy"), np.int64),
+            "rule": _ColumnFile(os.path.join(path, "rule.npy"), np.int32),
+        }
+        self._columns["row_ptr"].append([0])
+        self._columns["rule_ptr"].append([0])
+        # Record ids as UTF-8 bytes plus offsets, created with the first chunk carrying ids.
+        self._ids: Optional[Tuple[_ColumnFile, _ColumnFile]] = None
+
+    def __enter__(self) -> "ColumnarWriter":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def write(self, observations: Sequence, contexts: Optional[Sequence] = None, ids: Optional[Sequence] = None,
+              chunk_size: int = 4096):
+        """Scores and appends records, chunk_size at a time"""
+        if (self.engine.library_generation, self.engine.rules_generation) != self._generation:
+            raise RuntimeError("the engine's library changed while writing; open a new writer")
+        for start in range(0, len(observations), chunk_size):
+            stop = start + chunk_size
+            self.append(score_columns(
+                self.engine, observations[start:stop], None if contexts is None else contexts[start:stop],
+                None if ids is None else ids[start:stop], self.top_k, self.min_score,
+            ))
+
+    def append(self, chunk: ColumnarChunk):
+        """Appends an already scored chunk, e.g. one returned by a worker process"""
+        if (chunk.ids is None) != (self._ids is None) and self.rows:
+            raise ValueError("either every chunk or no chunk must carry ids")
+        columns = self._columns
+        columns["row_ptr"].append(self._entries + np.cumsum(chunk.row_counts))
+        columns["profile"].append(chunk.profile)
+        columns["score"].append(chunk.score)
+        columns["grade"].append(chunk.grade)
+        columns["rule_ptr"].append(self._fired + np.cumsum(chunk.rule_counts))
+        columns["rule"].append(chunk.rule)
+        if chunk.ids is not None:
+            if self._ids is None:
+                self._ids = (_ColumnFile(os.path.join(self.path, "id_ptr.npy"), np.int64),
+                             _ColumnFile(os.path.join(self.path, "id_bytes.npy"), np.uint8))
+                self._ids[0].append([0])
+            id_ptr, id_bytes = self._ids
+            encoded = [record_id.encode("utf-8") for record_id in chunk.ids]
+            id_ptr.append(id_bytes.count + np.cumsum([len(data) for data in encoded], dtype=np.int64))
+            id_bytes.append(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+        self.rows += len(chunk.row_counts)
+        self._entries += len(chunk.profile)
+        self._fired += len(chunk.rule)
+
+    def close(self):
+        columns = dict(self._columns)
+        if self._ids is not None:
+            columns["id_ptr"], columns["id_bytes"] = self._ids
+        for column in columns.values():
+            column.close()
+        engine = self.engine
+        meta = {
+            "format": FORMAT,
+            "rows": self.rows,
+            "library_version": engine.library_version,
+            "profiles": list(self._profiles),
+            "rules": self._rules,
+            "grades": [list(grade) for grade in engine.grades],
+            "grade_thresholds": list(engine.grade_thresholds),
+            "columns": {name: os.path.basename(column.path) for name, column in columns.items()},
+        }
+        with open(os.path.join(self.path, "meta.json"), "w", encoding="utf-8") as handle:
+            json.dump(meta, handle, indent=2)
+
+
+def export_columnar(engine: DeductionEngine, path: str, observations: Sequence,
+                    contexts: Optional[Sequence] = None, ids: Optional[Sequence] = None,
+                    top_k: Optional[int] = None, min_score: Optional[float] = None,
+                    chunk_size: int = 4096) -> int:
+    """Scores observations and writes them as a columnar result directory; returns the row count"""
+    with ColumnarWriter(path, engine, top_k, min_score) as writer:
+        writer.write(observations, contexts, ids, chunk_size)
+    return writer.rows
+
+
+class ColumnarResults:
+    """Read-only view of a columnar result directory; columns are memory-mapped"""
+
+    def __init__(self, path: str, mmap: bool = True):
+        if np is None:
+            raise ImportError("reading columnar results requires numpy")
+        with open(os.path.join(path, "meta.json"), encoding="utf-8") as handle:
+            meta = json.load(handle)
+        if meta.get("format") != FORMAT:
+            raise ValueError(f"{path}: not a {FORMAT} result directory")
+        self.path = path
+        self.meta = meta
+        self.profiles: List[str] = meta["profiles"]
+        self.rules: List[str] = meta["rules"]
+        self.grades: List[Tuple[str, str]] = [tuple(grade) for grade in meta["grades"]]
+        mode = "r" if mmap else None
+        self.columns: Dict[str, "np.ndarray"] = {
+            name: np.load(os.path.join(path, filename), mmap_mode=mode)
+            for name, filename in meta["columns"].items()
+        }
+        self.row_ptr = self.columns["row_ptr"]
+        self.profile = self.columns["profile"]
+        self.score = self.columns["score"]
+        self.grade = self.columns["grade"]
+        self.rule_ptr = self.columns["rule_ptr"]
+        self.rule = self.columns["rule"]
+        self.id_ptr = self.columns.get("id_ptr")
+        self.id_bytes = self.columns.get("id_bytes")
+
+    def __len__(self) -> int:
+        return len(self.row_ptr) - 1
+
+    def row(self, i: int) -> Tuple[List[ProfileResult], List[str]]:
+        """Rebuilds record i as (report, conflicts), the form analyze() returns"""
+        start, end = int(self.row_ptr[i]), int(self.row_ptr[i + 1])
+        report = []
+        for pid, score, grade in zip(self.profile[start:end].tolist(), self.score[start:end].tolist(),
+                                     self.grade[start:end].tolist()):
+            confidence, threat_level = self.grades[grade]
+            report.append(ProfileResult(self.profiles[pid], score, confidence, threat_level))
+        rule_start, rule_end = int(self.rule_ptr[i]), int(self.rule_ptr[i + 1])
+        return report, [self.rules[rule_id] for rule_id in self.rule[rule_start:rule_end].tolist()]
+
+    def record_id(self, i: int) -> Optional[str]:
+        """Id of record i, or None if the results were written without ids"""
+        if self.id_ptr is None:
+            return None
+        return self.id_bytes[int(self.id_ptr[i]):int(self.id_ptr[i + 1])].tobytes().decode("utf-8")
+
+    def record_ids(self) -> Optional[List[str]]:
+        """Every record id in row order, or None if the results were written without ids"""
+        if self.id_ptr is None:
+            return None
+        data = self.id_bytes.tobytes()
+        offsets = self.id_ptr.tolist()
+        return [data[start:end].decode("utf-8") for start, end in zip(offsets, offsets[1:])]
+
+    def entry_rows(self) -> "np.ndarray":
+        """Record number of every ranked entry"""
+        return np.repeat(np.arange(len(self), dtype=np.int64), np.diff(self.row_ptr))
+
+    def score_matrix(self, rows: Optional[slice] = None) -> "np.ndarray":
+        """Dense records x profiles score matrix (zero where a profile was not reported)"""
+        rows = rows or slice(0, len(self))
+        start, stop, _ = rows.indices(len(self))
+        lo, hi = int(self.row_ptr[start]), int(self.row_ptr[stop])
+        matrix = np.zeros((stop - start, len(self.profiles)), dtype=self.score.dtype)
+        entry_rows = np.repeat(np.arange(stop - start), np.diff(self.row_ptr[start:stop + 1]))
+        matrix[entry_rows, self.profile[lo:hi]] = self.score[lo:hi]
+        return matrix
+
+    def rule_flags(self) -> "np.ndarray":
+        """Dense records x rules boolean matrix of fired incongruence rules"""
+        flags = np.zeros((len(self), len(self.rules)), dtype=bool)
+        fired_rows = np.repeat(np.arange(len(self)), np.diff(self.rule_ptr))
+        flags[fired_rows, self.rule] = True
+        return flags
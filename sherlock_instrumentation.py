@@ -0,0 +1,166 @@
+"""Opt-in per-stage instrumentation for DeductionEngine.analyze.
+
+Attach an Instrumentation to an engine to time each analyze stage (base
+weighting, context adjustment, ranking, incongruence detection) and count
+cues matched, profiles touched, context clamps applied and rules fired:
+
+    metrics = PrometheusSink()
+    engine.instrumentation = Instrumentation(metrics, LogSink(sample_every=100))
+    ...
+    print(metrics.exposition())
+
+Each analyze call produces one AnalysisSample, passed to every sink. With no
+instrumentation attached (the default), analyze only pays for a few `is None`
+checks.
+"""
+
+import json
+import logging
+import time
+from bisect import bisect_left
+from collections import namedtuple
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+STAGES = ("base_weighting", "context_adjustment", "ranking", "incongruence")
+COUNTERS = ("cues_matched", "profiles_touched", "clamps_applied", "rules_fired")
+
+# Stage durations in seconds followed by the per-call counters.
+AnalysisSample = namedtuple("AnalysisSample", STAGES + COUNTERS)
+
+# Histogram bucket upper bounds in seconds, from 1 microsecond to 100 milliseconds.
+DEFAULT_BUCKETS = (
+    1e-6, 2.5e-6, 5e-6, 1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4,
+    5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1,
+)
+
+
+class Instrumentation:
+    """Fans AnalysisSamples out to a set of sinks"""
+
+    def __init__(self, *sinks):
+        self.sinks: Tuple = sinks
+        # Read by the engine once per analyze call.
+        self.clock = time.perf_counter
+
+    def add_sink(self, sink):
+        self.sinks = self.sinks + (sink,)
+
+    def record(self, sample: AnalysisSample):
+        for sink in self.sinks:
+            sink.record(sample)
+
+
+class HistogramSink:
+    """In-memory per-stage latency histograms plus counter totals"""
+
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.count = 0
+            # stage -> bucket counts (last slot is +Inf), total seconds, max seconds
+            self._histograms = {stage: [0] * (len(self.buckets) + 1) for stage in STAGES}
+            self._sums = dict.fromkeys(STAGES, 0.0)
+            self._max = dict.fromkeys(STAGES, 0.0)
+            self.counters = dict.fromkeys(COUNTERS, 0)
+
+    def record(self, sample: AnalysisSample):
+        buckets = self.buckets
+        with self._lock:
+            self.count += 1
+            for stage, seconds in zip(STAGES, sample):
+                self._histograms[stage][bisect_left(buckets, seconds)] += 1
+                self._sums[stage] += seconds
+                if seconds > self._max[stage]:
+                    self._max[stage] = seconds
+            counters = self.counters
+            for name, value in zip(COUNTERS, sample[len(STAGES):]):
+                counters[name] += value
+
+    def _quantile(self, stage: str, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (the stage max for the +Inf bucket)"""
+        target = q * self.count
+        seen = 0
+        for i, n in enumerate(self._histograms[stage]):
+            seen += n
+            if n and seen >= target:
+                return self.buckets[i] if i < len(self.buckets) else self._max[stage]
+        return 0.0
+
+    def snapshot(self) -> Dict:
+        """Returns per-stage count/mean/p50/p90/p99/max in microseconds and counter totals"""
+        with self._lock:
+            stages = {}
+            for stage in STAGES:
+                mean = self._sums[stage] / self.count if self.count else 0.0
+                stages[stage] = {
+                    "mean_us": round(mean * 1e6, 3),
+                    "p50_us": round(self._quantile(stage, 0.50) * 1e6, 3),
+                    "p90_us": round(self._quantile(stage, 0.90) * 1e6, 3),
+                    "p99_us": round(self._quantile(stage, 0.99) * 1e6, 3),
+                    "max_us": round(self._max[stage] * 1e6, 3),
+                }
+            return {"count": self.count, "stages": stages, "counters": dict(self.counters)}
+
+
+class PrometheusSink(HistogramSink):
+    """HistogramSink that renders its state in the Prometheus text exposition format"""
+
+    def __init__(self, namespace: str = "sherlock", buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.namespace = namespace
+        super().__init__(buckets)
+
+    def exposition(self) -> str:
+        name = f"{self.namespace}_analyze_stage_seconds"
+        lines = [f"# HELP {name} Time spent in each DeductionEngine.analyze stage.",
+                 f"# TYPE {name} histogram"]
+        with self._lock:
+            for stage in STAGES:
+                cumulative = 0
+                for bound, n in zip(self.buckets + (float("inf"),), self._histograms[stage]):
+                    cumulative += n
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f'{name}_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{stage="{stage}"}} {self._sums[stage]!r}')
+                lines.append(f'{name}_count{{stage="{stage}"}} {self.count}')
+            for counter in COUNTERS:
+                metric = f"{self.namespace}_analyze_{counter}_total"
+                lines.append(f"# HELP {metric} Total {counter.replace('_', ' ')} across analyze calls.")
+                lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{metric} {self.counters[counter]}")
+        return "\n".join(lines) + "\n"
+
+
+class LogSink:
+    """Writes every sample_every-th sample to a logger as one JSON object"""
+
+    def __init__(self, logger: Optional[logging.Logger] = None, level: int = logging.INFO,
+                 sample_every: int = 1):
+        self.logger = logger or logging.getLogger("sherlock.analyze")
+        self.level = level
+        self.sample_every = max(1, sample_every)
+        self._seen = 0
+
+    def record(self, sample: AnalysisSample):
+        self._seen += 1
+        if self._seen % self.sample_every or not self.logger.isEnabledFor(self.level):
+            return
+        values = sample._asdict()
+        event = {"event": "analyze",
+                 "stages_us": {stage: round(values[stage] * 1e6, 3) for stage in STAGES}}
+        event.update((counter, values[counter]) for counter in COUNTERS)
+        self.logger.log(self.level, json.dumps(event))
+
+
+class ListSink:
+    """Keeps every sample; meant for tests and ad-hoc inspection"""
+
+    def __init__(self):
+        self.samples: List[AnalysisSample] = []
+
+    def record(self, sample: AnalysisSample):
+        self.samples.append(sample)
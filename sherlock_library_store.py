@@ -0,0 +1,237 @@
+"""External cue libraries: JSON sources and a compiled, memory-mappable form.
+
+A library source is a JSON file:
+
+    {"version": "2026.10.1",
+     "cue_library": {"PHYSICAL_MARKERS": {...}, ..., "CONTEXT_FILTERS": {...}},
+     "incongruence_rules": [{"all_of": [...], "message": "..."}, ...]}
+
+compile_library() turns a source into a binary file holding the interned names
+plus packed profile-id and weight arrays. CompiledLibrary maps that file
+read-only, so worker processes skip parsing and share one copy of the arrays
+through the page cache. Both files are written atomically (temp file +
+rename), which is what DeductionEngine.reload_if_changed() relies on.
+
+    python sherlock_library_store.py export builtin.json
+    python sherlock_library_store.py compile team_library.json team_library.shlib
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections import namedtuple
+from typing import Dict, List, Optional, Tuple
+
+MAGIC = b"SHLKLIB1"
+_HEADER = struct.Struct("<8sQ")
+_ALIGN = 8
+
+# A parsed JSON library source.
+LibrarySource = namedtuple("LibrarySource", ["version", "cue_library", "incongruence_rules"])
+
+
+def read_source(path: str) -> LibrarySource:
+    """Parses and validates a JSON library source"""
+    with open(path, encoding="utf-8") as handle:
+        document = json.load(handle)
+    if not isinstance(document, dict) or not isinstance(document.get("cue_library"), dict):
+        raise ValueError(f"{path}: expected an object with a 'cue_library' mapping")
+    if "version" not in document:
+        raise ValueError(f"{path}: library has no 'version'")
+    return LibrarySource(str(document["version"]), document["cue_library"],
+                         document.get("incongruence_rules"))
+
+
+def _write_atomic(path: str, chunks: List[bytes]):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=os.path.basename(path))
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            for chunk in chunks:
+                handle.write(chunk)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, path)
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+
+
+def write_source(path: str, version: str, cue_library: Dict, incongruence_rules: Optional[List[Dict]] = None):
+    document = {"version": version, "cue_library": cue_library}
+    if incongruence_rules is not None:
+        document["incongruence_rules"] = incongruence_rules
+    _write_atomic(path, [json.dumps(document, indent=2).encode("utf-8"), b"\n"])
+
+
+def compile_library(source_path: str, target_path: str) -> str:
+    """Compiles a JSON library source into the binary format; returns its version"""
+    from deduction_engine_enhanced import SCORING_CATEGORIES
+
+    source = read_source(source_path)
+    library = source.cue_library
+    contexts = library.get("CONTEXT_FILTERS", {})
+    # Scored categories first, in scoring order, so segment order matches
+    # the order DeductionEngine compiles an in-memory library in.
+    categories = [c for c in SCORING_CATEGORIES if c in library]
+    categories += [c for c in library if c not in SCORING_CATEGORIES and c != "CONTEXT_FILTERS"]
+
+    profile_ids: Dict[str, int] = {}
+    cue_ids: Dict[str, int] = {}
+
+    def intern(table: Dict[str, int], name: str) -> int:
+        return table.setdefault(name, len(table))
+
+    seg_category, seg_cue, seg_ptr = array("i"), array("i"), array("q", [0])
+    seg_pids, seg_weights = array("i"), []
+    for category_id, category in enumerate(categories):
+        for cue, weights in library[category].items():
+            seg_category.append(category_id)
+            seg_cue.append(intern(cue_ids, cue))
+            seg_pids.extend(intern(profile_ids, profile) for profile in weights)
+            seg_weights.extend(weights.values())
+            seg_ptr.append(len(seg_pids))
+
+    ctx_ptr, ctx_pids, ctx_weights = array("q", [0]), array("i"), []
+    for modifiers in contexts.values():
+        ctx_pids.extend(intern(profile_ids, profile) for profile in modifiers)
+        ctx_weights.extend(modifiers.values())
+        ctx_ptr.append(len(ctx_pids))
+
+    weight_type = "q" if all(type(w) is int for w in seg_weights + ctx_weights) else "d"
+    sections = [
+        ("seg_category", seg_category), ("seg_cue", seg_cue), ("seg_ptr", seg_ptr),
+        ("seg_pids", seg_pids), ("seg_weights", array(weight_type, seg_weights)),
+        ("ctx_ptr", ctx_ptr), ("ctx_pids", ctx_pids), ("ctx_weights", array(weight_type, ctx_weights)),
+    ]
+
+    # Section offsets are relative to the end of the metadata block.
+    layout, offset = {}, 0
+    for name, values in sections:
+        layout[name] = [offset, len(values), values.typecode]
+        offset += -(-len(values) * values.itemsize // _ALIGN) * _ALIGN
+    meta = json.dumps({
+        "version": source.version,
+        "categories": categories,
+        "cues": list(cue_ids),
+        "profiles": list(profile_ids),
+        "contexts": list(contexts),
+        "incongruence_rules": source.incongruence_rules,
+        "sections": layout,
+    }).encode("utf-8")
+    meta += b" " * (-(_HEADER.size + len(meta)) % _ALIGN)
+
+    chunks = [_HEADER.pack(MAGIC, len(meta)), meta]
+    for _, values in sections:
+        data = values.tobytes()
+        chunks.append(data + b"\0" * (-len(data) % _ALIGN))
+    _write_atomic(target_path, chunks)
+    return source.version
+
+
+def is_compiled(path: str) -> bool:
+    with open(path, "rb") as handle:
+        return handle.read(len(MAGIC)) == MAGIC
+
+
+class CompiledLibrary:
+    """Read-only, memory-mapped view of a compiled library file"""
+
+    def __init__(self, path: str):
+        with open(path, "rb") as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        magic, meta_length = _HEADER.unpack_from(view)
+        if magic != MAGIC:
+            raise ValueError(f"{path}: not a compiled cue library")
+        base = _HEADER.size + meta_length
+        meta = json.loads(bytes(view[_HEADER.size:base]))
+
+        self.path = path
+        self.version = meta["version"]
+        self.categories: List[str] = meta["categories"]
+        self.cues: List[str] = meta["cues"]
+        self.profiles: List[str] = meta["profiles"]
+        self.contexts: List[str] = meta["contexts"]
+        self.incongruence_rules: Optional[List[Dict]] = meta["incongruence_rules"]
+        self._sections = {}
+        for name, (offset, count, typecode) in meta["sections"].items():
+            itemsize = array(typecode).itemsize
+            start = base + offset
+            self._sections[name] = view[start:start + count * itemsize].cast(typecode)
+
+    def segments(self):
+        """Yields (category, cue, profile ids, weights) with zero-copy array views"""
+        sections = self._sections
+        seg_ptr, pids, weights = sections["seg_ptr"], sections["seg_pids"], sections["seg_weights"]
+        categories, cues = self.categories, self.cues
+        for s, (category_id, cue_id) in enumerate(zip(sections["seg_category"], sections["seg_cue"])):
+            start, end = seg_ptr[s], seg_ptr[s + 1]
+            yield categories[category_id], cues[cue_id], pids[start:end], weights[start:end]
+
+    def context_entries(self):
+        """Yields (context, profile ids, modifiers) with zero-copy array views"""
+        sections = self._sections
+        ctx_ptr, pids, weights = sections["ctx_ptr"], sections["ctx_pids"], sections["ctx_weights"]
+        for c, context in enumerate(self.contexts):
+            start, end = ctx_ptr[c], ctx_ptr[c + 1]
+            yield context, pids[start:end], weights[start:end]
+
+    def cues_by_category(self) -> Dict[str, List[str]]:
+        result = {category: [] for category in self.categories}
+        for category_id, cue_id in zip(self._sections["seg_category"], self._sections["seg_cue"]):
+            result[self.categories[category_id]].append(self.cues[cue_id])
+        return result
+
+    def to_cue_library(self) -> Dict[str, Dict[str, Dict[str, float]]]:
+        """Materializes the nested-dict form of the library"""
+        profiles = self.profiles
+        library = {category: {} for category in self.categories}
+        for category, cue, pids, weights in self.segments():
+            library[category][cue] = {profiles[pid]: weight for pid, weight in zip(pids, weights)}
+        library["CONTEXT_FILTERS"] = {
+            context: {profiles[pid]: weight for pid, weight in zip(pids, weights)}
+            for context, pids, weights in self.context_entries()
+        }
+        return library
+
+
+def open_library(path: str):
+    """Opens a library file: a CompiledLibrary for compiled files, else a LibrarySource"""
+    return CompiledLibrary(path) if is_compiled(path) else read_source(path)
+
+
+def stat_key(path: str) -> Tuple[int, int, int]:
+    """File identity used to detect replacement: (inode, size, mtime_ns)"""
+    stat = os.stat(path)
+    return stat.st_ino, stat.st_size, stat.st_mtime_ns
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Manage external cue libraries.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    compile_cmd = commands.add_parser("compile", help="compile a JSON library to the binary format")
+    compile_cmd.add_argument("source")
+    compile_cmd.add_argument("target")
+    export_cmd = commands.add_parser("export", help="write the built-in library as a JSON source")
+    export_cmd.add_argument("target")
+    export_cmd.add_argument("--version", default="builtin")
+    args = parser.parse_args(argv)
+
+    if args.command == "compile":
+        version = compile_library(args.source, args.target)
+        print(f"compiled {args.source} (version {version}) -> {args.target}")
+    else:
+        from deduction_engine_enhanced import DeductionEngine
+        engine = DeductionEngine()
+        write_source(args.target, args.version, engine.cue_library, engine.incongruence_rules)
+        print(f"exported built-in library -> {args.target}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
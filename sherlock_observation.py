@@ -0,0 +1,161 @@
+"""Compact, canonical observation encoding.
+
+Cue names are interned to stable integer ids by a Vocabulary, and an
+Observation stores its cue set as an integer bitmask over those ids.
+Duplicate cues collapse, membership is a bit test, set algebra is integer
+arithmetic and equal observations hash equally regardless of cue order.
+
+Contexts are kept as an ordered tuple of distinct names instead: analyze()
+applies them in order and clamps at zero after each one, so their order can
+change the result.
+"""
+
+from threading import Lock
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+
+def _bit_ids(mask: int) -> Iterator[int]:
+    """Yields the positions of the set bits of mask in increasing order"""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+class Vocabulary:
+    """Interns cue names to stable integer ids; ids are never reassigned"""
+
+    def __init__(self):
+        self._cue_ids: Dict[str, int] = {}
+        self._cue_names: List[str] = []
+        self._lock = Lock()
+
+    def __getstate__(self) -> Dict:
+        state = self.__dict__.copy()
+        del state["_lock"]
+        return state
+
+    def __setstate__(self, state: Dict):
+        self.__dict__.update(state)
+        self._lock = Lock()
+
+    def cue_id(self, name: str) -> int:
+        cid = self._cue_ids.get(name)
+        if cid is None:
+            with self._lock:
+                cid = self._cue_ids.get(name)
+                if cid is None:
+                    cid = len(self._cue_names)
+                    self._cue_names.append(name)
+                    self._cue_ids[name] = cid
+        return cid
+
+    def find_cue(self, name: str) -> Optional[int]:
+        """Returns the id of a cue name without interning it"""
+        return self._cue_ids.get(name)
+
+    def cue_name(self, cue_id: int) -> str:
+        return self._cue_names[cue_id]
+
+    def cue_mask(self, names: Iterable[str]) -> int:
+        mask = 0
+        for name in names:
+            mask |= 1 << self.cue_id(name)
+        return mask
+
+    def observe(self, cues: Iterable[str] = (), contexts: Iterable[str] = ()) -> "Observation":
+        return Observation(self, self.cue_mask(cues), contexts)
+
+
+class Observation:
+    """Immutable set of observed cues, stored as a bitmask, plus ordered environmental contexts.
+
+    Iterating an Observation yields its cue names in id order, and `in` tests
+    cue membership, so it can stand in for a list of cue names. contexts keeps
+    the order contexts were first given in, without duplicates.
+    """
+
+    __slots__ = ("vocabulary", "cue_mask", "contexts")
+
+    def __init__(self, vocabulary: Vocabulary, cue_mask: int = 0, contexts: Iterable[str] = ()):
+        object.__setattr__(self, "vocabulary", vocabulary)
+        object.__setattr__(self, "cue_mask", cue_mask)
+        object.__setattr__(self, "contexts", tuple(dict.fromkeys(contexts)))
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Observation is immutable")
+
+    def __reduce__(self):
+        return Observation, (self.vocabulary, self.cue_mask, self.contexts)
+
+    def cue_ids(self) -> Iterator[int]:
+        return _bit_ids(self.cue_mask)
+
+    @property
+    def cues(self) -> Tuple[str, ...]:
+        return tuple(map(self.vocabulary.cue_name, self.cue_ids()))
+
+    def has_context(self, name: str) -> bool:
+        return name in self.contexts
+
+    def __contains__(self, name: str) -> bool:
+        cid = self.vocabulary.find_cue(name)
+        return cid is not None and bool(self.cue_mask >> cid & 1)
+
+    def __iter__(self) -> Iterator[str]:
+        cue_name = self.vocabulary.cue_name
+        for cid in _bit_ids(self.cue_mask):
+            yield cue_name(cid)
+
+    def __len__(self) -> int:
+        return bin(self.cue_mask).count("1")
+
+    def __bool__(self) -> bool:
+        return bool(self.cue_mask or self.contexts)
+
+    def _check(self, other: "Observation"):
+        if not isinstance(other, Observation):
+            return False
+        if other.vocabulary is not self.vocabulary:
+            raise ValueError("cannot combine observations from different vocabularies")
+        return True
+
+    def __or__(self, other: "Observation") -> "Observation":
+        if not self._check(other):
+            return NotImplemented
+        return Observation(self.vocabulary, self.cue_mask | other.cue_mask, self.contexts + other.contexts)
+
+    def __and__(self, other: "Observation") -> "Observation":
+        if not self._check(other):
+            return NotImplemented
+        return Observation(self.vocabulary, self.cue_mask & other.cue_mask,
+                           [context for context in self.contexts if context in other.contexts])
+
+    def __sub__(self, other: "Observation") -> "Observation":
+        if not self._check(other):
+            return NotImplemented
+        return Observation(self.vocabulary, self.cue_mask & ~other.cue_mask,
+                           [context for context in self.contexts if context not in other.contexts])
+
+    def __xor__(self, other: "Observation") -> "Observation":
+        if not self._check(other):
+            return NotImplemented
+        contexts = [context for context in self.contexts if context not in other.contexts]
+        contexts += [context for context in other.contexts if context not in self.contexts]
+        return Observation(self.vocabulary, self.cue_mask ^ other.cue_mask, contexts)
+
+    def issubset(self, other: "Observation") -> bool:
+        self._check(other)
+        return (self.cue_mask & ~other.cue_mask) == 0 and set(self.contexts) <= set(other.contexts)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Observation):
+            return NotImplemented
+        return (self.vocabulary is other.vocabulary and self.cue_mask == other.cue_mask
+                and self.contexts == other.contexts)
+
+    def __hash__(self) -> int:
+        return hash((self.cue_mask, self.contexts))
+
+    def __repr__(self) -> str:
+        return f"Observation(cues={list(self.cues)}, contexts={list(self.contexts)})"
@@ -0,0 +1,124 @@
+"""Minimal cue sets: the fewest cues that push a profile into a confidence band.
+
+minimal_cue_sets() answers questions like "what is the smallest observation
+that makes this subject Critical/Certain for Military during a job
+interview?" without enumerating combinations through analyze().
+
+A profile's score only depends on the cues that weight it, and the context
+stage (add modifier, clamp at zero) never lowers the result for a larger base
+total. So the candidates are the profile's positively weighted cues from the
+engine's reverse index, strongest first, and the search goes through set
+sizes in increasing order. Branches are cut as soon as even the strongest
+remaining cues cannot reach the target. The optional exclusive and
+no-conflict constraints are checked on complete sets only, since adding cues
+can both create and clear them.
+"""
+
+from bisect import bisect_right
+from itertools import accumulate
+from typing import List, Optional, Sequence, Tuple
+
+from deduction_engine_enhanced import DeductionEngine
+
+
+class SearchLimitReached(Exception):
+    """Raised when minimal_cue_sets explores more than max_nodes partial sets"""
+
+
+def _context_adjuster(engine: DeductionEngine, profile: str, contexts: Sequence[str]):
+    """Returns base total -> final score for profile under contexts, as analyze applies them"""
+    pid = engine.profile_id(profile)
+    modifiers = []
+    for context in contexts:
+        modifier = engine.context_modifiers(context).get(pid)
+        if modifier is not None:
+            modifiers.append(modifier)
+
+    def adjust(score):
+        for modifier in modifiers:
+            score += modifier
+            if score < 0:
+                score = 0
+        return score
+
+    return adjust
+
+
+def minimal_cue_sets(engine: DeductionEngine, profile: str, contexts: Sequence[str] = (),
+                     confidence: Optional[str] = None, exclusive: bool = False, allow_conflicts: bool = True,
+                     exclude: Sequence[str] = (), max_size: Optional[int] = None, limit: int = 1,
+                     max_nodes: int = 1000000) -> List[Tuple[str, ...]]:
+    """Finds up to limit smallest cue sets that put profile at or above a confidence band.
+
+    confidence is a confidence label (default: the highest band). With
+    exclusive, the profile must also rank first in the report; without
+    allow_conflicts, no incongruence rule may fire. Cues in exclude are never
+    used. Only cues that raise the profile's score are considered, so a set
+    is never padded with an unrelated cue just to clear a conflict. Returns
+    an empty list if no set of at most max_size cues qualifies, and raises
+    SearchLimitReached after max_nodes search nodes.
+    """
+    engine.profile_id(profile)  # KeyError for an unknown profile
+    labels = [grade[0] for grade in engine.grades]
+    band = len(labels) - 1 if confidence is None else labels.index(confidence)
+    thresholds = engine.grade_thresholds
+    adjust = _context_adjuster(engine, profile, contexts)
+
+    def reaches(base) -> bool:
+        score = adjust(base)
+        return score > 0 and bisect_right(thresholds, score) >= band
+
+    excluded = set(exclude)
+    candidates = [(cue, weight) for cue, weight in engine.cues_for_profile(profile)
+                  if weight > 0 and cue not in excluded]
+    cues = [cue for cue, _ in candidates]
+    weights = [weight for _, weight in candidates]
+    # Candidates are sorted, so best(i, k) is the largest total of k cues from position i on.
+    prefix = [0] + list(accumulate(weights))
+
+    def best(i: int, k: int):
+        return prefix[min(i + k, len(weights))] - prefix[i]
+
+    def accept(chosen: List[int]) -> bool:
+        names = [cues[i] for i in chosen]
+        if exclusive:
+            report, conflicts = engine.analyze(names, list(contexts), top_k=1)
+            if not report or report[0].profile != profile:
+                return False
+        elif not allow_conflicts:
+            conflicts = engine.detect_incongruence(names)
+        if not allow_conflicts and conflicts:
+            return False
+        return True
+
+    found: List[Tuple[str, ...]] = []
+    nodes = 0
+    upper = len(cues) if max_size is None else min(max_size, len(cues))
+
+    def search(start: int, chosen: List[int], total, remaining: int):
+        nonlocal nodes
+        nodes += 1
+        if nodes > max_nodes:
+            raise SearchLimitReached(f"explored more than {max_nodes} partial cue sets")
+        if remaining == 0:
+            if reaches(total) and accept(chosen):
+                found.append(tuple(cues[i] for i in chosen))
+            return
+        for i in range(start, len(cues) - remaining + 1):
+            # Bound: the strongest cues still available cannot reach the target.
+            if not reaches(total + best(i, remaining)):
+                return
+            chosen.append(i)
+            search(i + 1, chosen, total + weights[i], remaining - 1)
+            chosen.pop()
+            if len(found) >= limit:
+                return
+
+    for size in range(1, upper + 1):
+        # No set of this size reaches the target: the strongest one does not.
+        if not reaches(best(0, size)):
+            continue
+        search(0, [], 0, size)
+        if found:
+            return found[:limit]
+    return []
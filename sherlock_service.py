@@ -0,0 +1,314 @@
+"""Async JSON scoring service around DeductionEngine.
+
+An ASGI application with no framework dependency. Concurrent requests are
+queued and coalesced into micro-batches, flushed when a batch reaches
+max_batch_size or its oldest request has waited max_wait_ms, and scored
+together off the event loop. The queue is bounded: when it is full, requests
+are rejected with 503 instead of piling up. An engine loaded from a library
+file picks up a replaced file before the next batch, checking at most once
+per reload_interval seconds; a file that fails to load leaves the current
+library in place.
+
+    POST /analyze        {"cues": [...], "contexts": [...], "top_k": 8}
+    POST /incongruence   {"cues": [...]}
+    GET  /stats          queue depth, batch sizes, latency percentiles
+    GET  /health
+
+    uvicorn sherlock_service:app --port 8000
+    python sherlock_service.py --port 8000 --max-batch-size 128 --max-wait-ms 2
+"""
+
+import argparse
+import asyncio
+import json
+import sys
+import time
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from deduction_engine_enhanced import DeductionEngine, np
+
+MAX_BODY_BYTES = 1 << 20
+
+
+class ServiceOverloaded(Exception):
+    """Raised when the request queue is full"""
+
+
+class LatencyStats:
+    """Rolling window of request latencies with percentile summaries"""
+
+    def __init__(self, window: int = 10000):
+        self._samples = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+        self.count += 1
+
+    def summary(self) -> Dict[str, float]:
+        samples = sorted(self._samples)
+        if not samples:
+            return {"count": self.count}
+
+        def percentile(q: float) -> float:
+            return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 3)
+
+        return {"count": self.count, "p50_ms": percentile(0.50), "p90_ms": percentile(0.90),
+                "p99_ms": percentile(0.99), "max_ms": round(samples[-1] * 1000, 3)}
+
+
+class MicroBatcher:
+    """Coalesces concurrent scoring requests into batches for one engine"""
+
+    def __init__(self, engine: DeductionEngine, max_batch_size: int = 64, max_wait_ms: float = 2.0,
+                 max_queue: int = 4096, reload_interval: Optional[float] = 1.0):
+        self.engine = engine
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        # Seconds between library file checks; None disables hot reload.
+        self.reload_interval = reload_interval
+        self._reload_checked = time.monotonic()
+        self.reloads = 0
+        self.reload_error: Optional[str] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._max_queue = max_queue
+        self._worker: Optional[asyncio.Task] = None
+        self.latency = LatencyStats()
+        self.batches = 0
+        self.batched_requests = 0
+        self.rejected = 0
+
+    def start(self):
+        if self._worker is None:
+            self._queue = asyncio.Queue(self._max_queue)
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._worker is not None:
+            self._worker.cancel()
+            try:
+                await self._worker
+            except asyncio.CancelledError:
+                pass
+            self._worker = None
+
+    async def submit(self, kind: str, cues: List[str], contexts: List[str], top_k: Optional[int] = None):
+        """Queues one request and waits for its result; raises ServiceOverloaded when full"""
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self._queue.put_nowait((kind, cues, contexts, top_k, future, time.perf_counter()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise ServiceOverloaded() from None
+        return await future
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        queue = self._queue
+        while True:
+            batch = [await queue.get()]
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            # Drain anything else already queued, up to the batch limit.
+            while len(batch) < self.max_batch_size and not queue.empty():
+                batch.append(queue.get_nowait())
+
+            try:
+                results = await loop.run_in_executor(None, self._score, batch)
+            except Exception as exc:
+                for item in batch:
+                    if not item[4].done():
+                        item[4].set_exception(exc)
+                continue
+            self.batches += 1
+            self.batched_requests += len(batch)
+            now = time.perf_counter()
+            for item, result in zip(batch, results):
+                elapsed = now - item[5]
+                self.latency.record(elapsed)
+                if not item[4].done():
+                    item[4].set_result((result, elapsed))
+
+    def _maybe_reload(self):
+        """Reloads the engine's library file if it changed, at most once per reload_interval"""
+        if self.reload_interval is None or self.engine.library_path is None:
+            return
+        now = time.monotonic()
+        if now - self._reload_checked < self.reload_interval:
+            return
+        self._reload_checked = now
+        try:
+            if self.engine.reload_if_changed():
+                self.reloads += 1
+                self.reload_error = None
+        except Exception as exc:
+            # Keep serving the library already loaded; the file may be fixed and retried.
+            self.reload_error = f"{type(exc).__name__}: {exc}"
+
+    def _score(self, batch: List[Tuple]) -> List:
+        self._maybe_reload()
+        engine = self.engine
+        # Requests are grouped by top_k so each is scored to just the report it asked for.
+        groups: Dict[Optional[int], List[int]] = {}
+        for i, item in enumerate(batch):
+            if item[0] == "analyze":
+                groups.setdefault(item[3], []).append(i)
+        results = [None] * len(batch)
+        for top_k, analyze_items in groups.items():
+            observations = [batch[i][1] for i in analyze_items]
+            contexts = [batch[i][2] for i in analyze_items]
+            if np is not None:
+                outcomes = engine.analyze_batch(observations, contexts, top_k=top_k)
+            else:
+                outcomes = [engine.analyze(cues, ctx, top_k=top_k) for cues, ctx in zip(observations, contexts)]
+            for i, outcome in zip(analyze_items, outcomes):
+                results[i] = outcome
+        for i, item in enumerate(batch):
+            if item[0] == "incongruence":
+                results[i] = engine.detect_incongruence(item[1])
+        return results
+
+    def stats(self) -> Dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "batches": self.batches,
+            "mean_batch_size": round(self.batched_requests / self.batches, 2) if self.batches else 0,
+            "rejected": self.rejected,
+            "latency": self.latency.summary(),
+            "library_version": self.engine.library_version,
+            "reloads": self.reloads,
+            "reload_error": self.reload_error,
+        }
+
+
+class HTTPError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+def _string_list(payload: Dict, field: str) -> List[str]:
+    value = payload.get(field, [])
+    if not isinstance(value, list) or not all(isinstance(item, str) for item in value):
+        raise HTTPError(400, f"'{field}' must be a list of strings")
+    return value
+
+
+class ScoringService:
+    """ASGI application exposing analyze and detect_incongruence over JSON"""
+
+    def __init__(self, engine: Optional[DeductionEngine] = None, **batcher_options):
+        self.batcher = MicroBatcher(engine or DeductionEngine(), **batcher_options)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+        if scope["type"] != "http":
+            return
+        try:
+            status, body = await self._dispatch(scope, receive)
+        except HTTPError as exc:
+            status, body = exc.status, {"error": str(exc)}
+        payload = json.dumps(body).encode("utf-8")
+        await send({"type": "http.response.start", "status": status,
+                    "headers": [(b"content-type", b"application/json"),
+                                (b"content-length", str(len(payload)).encode())]})
+        await send({"type": "http.response.body", "body": payload})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                self.batcher.start()
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                await self.batcher.stop()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _dispatch(self, scope, receive) -> Tuple[int, Dict]:
+        method, path = scope["method"], scope["path"]
+        if method == "GET" and path == "/health":
+            return 200, {"status": "ok", "library_version": self.batcher.engine.library_version}
+        if method == "GET" and path == "/stats":
+            return 200, self.batcher.stats()
+        if path not in ("/analyze", "/incongruence"):
+            raise HTTPError(404, "not found")
+        if method != "POST":
+            raise HTTPError(405, "method not allowed")
+
+        payload = await self._read_json(receive)
+        cues = _string_list(payload, "cues")
+        try:
+            if path == "/analyze":
+                top_k = payload.get("top_k")
+                if top_k is not None and (not isinstance(top_k, int) or top_k < 0):
+                    raise HTTPError(400, "'top_k' must be a non-negative integer")
+                (report, conflicts), elapsed = await self.batcher.submit(
+                    "analyze", cues, _string_list(payload, "contexts"), top_k)
+                return 200, {"report": [result.as_dict() for result in report], "conflicts": conflicts,
+                             "latency_ms": round(elapsed * 1000, 3)}
+            conflicts, elapsed = await self.batcher.submit("incongruence", cues, [])
+            return 200, {"conflicts": conflicts, "latency_ms": round(elapsed * 1000, 3)}
+        except ServiceOverloaded:
+            raise HTTPError(503, "scoring queue is full, retry later") from None
+
+    @staticmethod
+    async def _read_json(receive) -> Dict:
+        chunks, size = [], 0
+        while True:
+            message = await receive()
+            chunk = message.get("body", b"")
+            size += len(chunk)
+            if size > MAX_BODY_BYTES:
+                raise HTTPError(413, "request body too large")
+            chunks.append(chunk)
+            if not message.get("more_body", False):
+                break
+        try:
+            payload = json.loads(b"".join(chunks) or b"{}")
+        except ValueError:
+            raise HTTPError(400, "request body is not valid JSON") from None
+        if not isinstance(payload, dict):
+            raise HTTPError(400, "request body must be a JSON object")
+        return payload
+
+
+app = ScoringService()
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve DeductionEngine over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--library", help="JSON or compiled cue library file (default: built-in)")
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=2.0)
+    parser.add_argument("--max-queue", type=int, default=4096)
+    parser.add_argument("--reload-interval", type=float, default=1.0,
+                        help="seconds between checks of the library file for changes (0 checks every batch)")
+    args = parser.parse_args(argv)
+
+    try:
+        import uvicorn
+    except ImportError:
+        parser.exit(1, "error: running the service requires uvicorn (pip install uvicorn)\n")
+    service = ScoringService(DeductionEngine(library_path=args.library), max_batch_size=args.max_batch_size,
+                             max_wait_ms=args.max_wait_ms, max_queue=args.max_queue,
+                             reload_interval=args.reload_interval)
+    uvicorn.run(service, host=args.host, port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""Incremental analysis for observations that change one cue at a time.
+
+An AnalysisSession holds the current cue and context selection for one
+subject and keeps the analysis up to date as cues and contexts are added or
+removed. Each change only touches the profiles weighted by that cue or
+context and the rules that mention that cue, so its cost does not grow with
+the size of the observation.
+
+The context stage clamps scores at zero after each modifier, and a clamp
+cannot be undone by subtracting the modifier again. The session therefore
+keeps each profile's unclamped base total and re-applies the active contexts
+to that total whenever the profile changes.
+
+    session = AnalysisSession(engine)
+    session.add_cue("neck_pacifying_touch")
+    session.add_context("job_interview")
+    report, conflicts = session.result(top_k=5)
+
+After any sequence of changes, session.result() equals
+engine.analyze(session.cues, session.contexts). Sessions are not thread-safe.
+"""
+
+from bisect import bisect_left, bisect_right, insort
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from deduction_engine_enhanced import DeductionEngine, ProfileResult, trim_report
+
+
+class AnalysisSession:
+    """Analysis state for one evolving observation, updated by cue and context deltas"""
+
+    def __init__(self, engine: DeductionEngine, cues: Iterable[str] = (), contexts: Iterable[str] = ()):
+        self.engine = engine
+        # cue -> sequence number; insertion order is the cue order analyze() sees.
+        self._cues: Dict[str, int] = {}
+        self._contexts: List[str] = []
+        self._sequence = 0
+        self._reset()
+        self.update(add_cues=cues, add_contexts=contexts)
+
+    # --- State (re)construction ---
+    def _reset(self):
+        engine = self.engine
+        self._generation = (engine.library_generation, engine.rules_generation)
+        self._grading = (engine.grade_thresholds, engine.grades)
+        self._profile_names = engine.profile_names
+        self._integral = engine.integral_weights
+
+        # pid -> {(category rank, cue sequence, position): weight} for active cues;
+        # the smallest key is the profile's first touch in analyze().
+        self._touches: Dict[int, Dict[Tuple[int, int, int], float]] = {}
+        self._base: Dict[int, float] = {}
+        self._first: Dict[int, Tuple[int, int, int]] = {}
+        # Ranked (-score, first touch, pid) entries for profiles scoring above zero.
+        self._ranking: List[Tuple] = []
+        self._entries: Dict[int, Tuple] = {}
+        self._results: Dict[int, ProfileResult] = {}
+        self._context_maps: Dict[str, Dict[int, float]] = {}
+
+        self._rule_conditions = engine.rule_conditions
+        self._rule_messages = engine.rule_messages
+        # cue -> ids of every rule that mentions it, for re-evaluating only those rules.
+        self._mentions: Dict[str, List[int]] = {}
+        for rule_id, (all_of, any_of, none_of) in enumerate(self._rule_conditions):
+            for cue in all_of | any_of | none_of:
+                self._mentions.setdefault(cue, []).append(rule_id)
+        self._cue_set: Set[str] = set()
+        # With no cues selected, only rules that have neither all_of nor any_of can hold.
+        self._fired: Set[int] = {rule_id for rule_id in range(len(self._rule_conditions))
+                                 if self._rule_holds(rule_id)}
+
+        # Replay the current selection against the new index.
+        cues, contexts = list(self._cues), self._contexts
+        self._cues, self._contexts = {}, []
+        for cue in cues:
+            self.add_cue(cue)
+        for context in contexts:
+            self.add_context(context)
+
+    def _sync(self):
+        """Rebuilds the session if the engine's library, rules or grades were replaced"""
+        engine = self.engine
+        if ((engine.library_generation, engine.rules_generation) != self._generation
+                or self._grading != (engine.grade_thresholds, engine.grades)):
+            self._reset()
+
+    # --- Selection ---
+    @property
+    def cues(self) -> Tuple[str, ...]:
+        return tuple(self._cues)
+
+    @property
+    def contexts(self) -> Tuple[str, ...]:
+        return tuple(self._contexts)
+
+    def add_cue(self, cue: str) -> bool:
+        """Adds a cue; returns False if it was already selected"""
+        self._sync()
+        if cue in self._cues:
+            return False
+        sequence = self._cues[cue] = self._sequence
+        self._sequence += 1
+        self._cue_set.add(cue)
+
+        touches, base, first = self._touches, self._base, self._first
+        changed = set()
+        for rank, profile_ids, weights in self.engine.cue_segments(cue):
+            for position, (pid, weight) in enumerate(zip(profile_ids, weights)):
+                key = (rank, sequence, position)
+                entry = touches.get(pid)
+                if entry is None:
+                    touches[pid] = {key: weight}
+                    base[pid] = weight
+                    first[pid] = key
+                else:
+                    entry[key] = weight
+                    base[pid] += weight
+                    if key < first[pid]:
+                        first[pid] = key
+                changed.add(pid)
+        self._refresh(changed)
+        self._recheck_rules(cue)
+        return True
+
+    def remove_cue(self, cue: str) -> bool:
+        """Removes a cue; returns False if it was not selected"""
+        self._sync()
+        sequence = self._cues.pop(cue, None)
+        if sequence is None:
+            return False
+        self._cue_set.discard(cue)
+
+        touches, base, first = self._touches, self._base, self._first
+        changed = set()
+        for rank, profile_ids, weights in self.engine.cue_segments(cue):
+            for position, (pid, weight) in enumerate(zip(profile_ids, weights)):
+                key = (rank, sequence, position)
+                entry = touches[pid]
+                del entry[key]
+                if not entry:
+                    del touches[pid], base[pid], first[pid]
+                else:
+                    base[pid] -= weight
+                    if first[pid] == key:
+                        first[pid] = min(entry)
+                changed.add(pid)
+        self._refresh(changed)
+        self._recheck_rules(cue)
+        return True
+
+    def toggle_cue(self, cue: str) -> bool:
+        """Adds the cue if absent, else removes it; returns whether it is now selected"""
+        if cue in self._cues:
+            self.remove_cue(cue)
+            return False
+        self.add_cue(cue)
+        return True
+
+    def add_context(self, context: str) -> bool:
+        """Appends a context; returns False if it was already active"""
+        self._sync()
+        if context in self._contexts:
+            return False
+        self._contexts.append(context)
+        self._refresh(self._context_map(context).keys() & self._touches.keys())
+        return True
+
+    def remove_context(self, context: str) -> bool:
+        """Removes a context; returns False if it was not active"""
+        self._sync()
+        if context not in self._contexts:
+            return False
+        self._contexts.remove(context)
+        self._refresh(self._context_map(context).keys() & self._touches.keys())
+        return True
+
+    def toggle_context(self, context: str) -> bool:
+        if context in self._contexts:
+            self.remove_context(context)
+            return False
+        self.add_context(context)
+        return True
+
+    def update(self, add_cues: Iterable[str] = (), remove_cues: Iterable[str] = (),
+               add_contexts: Iterable[str] = (), remove_contexts: Iterable[str] = ()):
+        """Applies several deltas: removals first, then additions"""
+        for cue in remove_cues:
+            self.remove_cue(cue)
+        for context in remove_contexts:
+            self.remove_context(context)
+        for cue in add_cues:
+            self.add_cue(cue)
+        for context in add_contexts:
+            self.add_context(context)
+
+    # --- Incremental re-derivation ---
+    def _context_map(self, context: str) -> Dict[int, float]:
+        mapping = self._context_maps.get(context)
+        if mapping is None:
+            mapping = self._context_maps[context] = self.engine.context_modifiers(context)
+        return mapping
+
+    def _score(self, pid: int) -> float:
+        """Final score of a touched profile: its base total with the active contexts applied"""
+        if self._integral:
+            score = self._base[pid]
+        else:
+            # Re-add in analyze() order so float totals match to the last bit.
+            entry = self._touches[pid]
+            weights = iter([entry[key] for key in sorted(entry)])
+            score = next(weights)
+            for weight in weights:
+                score += weight
+        for context in self._contexts:
+            modifier = self._context_map(context).get(pid)
+            if modifier is not None:
+                score += modifier
+                if score < 0:
+                    score = 0
+        return score
+
+    def _refresh(self, pids: Iterable[int]):
+        """Re-scores, re-grades and re-ranks the given profiles"""
+        ranking, entries, results = self._ranking, self._entries, self._results
+        thresholds, grades = self._grading
+        profile_names = self._profile_names
+        for pid in pids:
+            old = entries.pop(pid, None)
+            if old is not None:
+                del ranking[bisect_left(ranking, old)]
+                del results[pid]
+            if pid not in self._touches:
+                continue
+            score = self._score(pid)
+            if score > 0:
+                new = entries[pid] = (-score, self._first[pid], pid)
+                insort(ranking, new)
+                confidence, threat_level = grades[bisect_right(thresholds, score)]
+                results[pid] = ProfileResult(profile_names[pid], score, confidence, threat_level)
+
+    def _rule_holds(self, rule_id: int) -> bool:
+        all_of, any_of, none_of = self._rule_conditions[rule_id]
+        present = self._cue_set
+        if all_of and not all_of <= present:
+            return False
+        if any_of and any_of.isdisjoint(present):
+            return False
+        return not (none_of and not none_of.isdisjoint(present))
+
+    def _recheck_rules(self, cue: str):
+        for rule_id in self._mentions.get(cue, ()):
+            if self._rule_holds(rule_id):
+                self._fired.add(rule_id)
+            else:
+                self._fired.discard(rule_id)
+
+    # --- Results ---
+    def report(self, top_k: Optional[int] = None, min_score: Optional[float] = None) -> List[ProfileResult]:
+        """Ranked profiles for the current selection, as analyze() would report them"""
+        self._sync()
+        ranking = self._ranking if top_k is None else self._ranking[:top_k]
+        results = self._results
+        return trim_report([results[pid] for _, _, pid in ranking], None, min_score)
+
+    def conflicts(self) -> List[str]:
+        self._sync()
+        messages = self._rule_messages
+        return [messages[rule_id] for rule_id in sorted(self._fired)]
+
+    def result(self, top_k: Optional[int] = None,
+               min_score: Optional[float] = None) -> Tuple[List[ProfileResult], List[str]]:
+        """Returns (report, conflicts) in the same form as DeductionEngine.analyze"""
+        return self.report(top_k, min_score), self.conflicts()
+
+    def score_of(self, profile: str) -> Optional[ProfileResult]:
+        """Current result for one profile, or None if it does not score above zero"""
+        self._sync()
+        try:
+            return self._results.get(self.engine.profile_id(profile))
+        except KeyError:
+            return None
@@ -0,0 +1,296 @@
+"""Maps free-text analyst notes to canonical cue and context ids.
+
+A note such as "kept touching his neck, feet toward the door" is split into
+clauses, each word is normalized and matched against an index built once from
+the engine's cue and context names plus an alias table. Misspelled words are
+matched through a character-trigram index over the vocabulary, so lookup cost
+depends on the note, not on the size of the vocabulary.
+
+A match is dropped when a negator ("not", "no", "never", "without",
+"didn't", ...) comes before it in the same clause, so "did not touch his
+neck" does not report neck_pacifying_touch.
+
+    python sherlock_text_resolver.py "kept touching his neck, feet toward the door"
+    python sherlock_text_resolver.py --check
+"""
+
+import argparse
+import re
+import sys
+from collections import namedtuple
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from deduction_engine_enhanced import DeductionEngine
+from sherlock_observation import Observation
+
+# Natural phrasings for library cues and contexts: phrase -> canonical name.
+DEFAULT_ALIASES = {
+    "cue": {
+        "touching neck": "neck_pacifying_touch",
+        "rubbing neck": "neck_pacifying_touch",
+        "feet toward door": "feet_pointing_exit",
+        "feet pointing door": "feet_pointing_exit",
+        "looking around room": "peripheral_scanning",
+        "scanning room": "peripheral_scanning",
+        "arms crossed": "ventral_shielding_high",
+        "crossed arms": "ventral_shielding_high",
+        "covering belly": "ventral_shielding_low",
+        "turned away": "ventral_denial",
+        "covering eyes": "eye_blocking",
+        "rubbing eyes": "eye_blocking",
+        "pressed lips": "lip_compression",
+        "tight lips": "lip_compression",
+        "crossed ankles": "ankle_locking",
+        "fingertips together": "hand_steepling",
+        "did not flinch": "lack_of_startle_response",
+        "half smile": "unilateral_lip_curl",
+        "smirk": "unilateral_lip_curl",
+        "fake smile": "asymmetric_smile",
+        "genuine smile": "duchenne_smile",
+        "real smile": "duchenne_smile",
+        "shrugged": "partial_shrug",
+        "chewed nails": "bitten_nails",
+        "bit nails": "bitten_nails",
+        "biting nails": "bitten_nails",
+        "yellow fingers": "nicotine_stains_fingers",
+        "smoker fingers": "nicotine_stains_fingers",
+        "watch face inside wrist": "inward_watch_face",
+        "trembling voice": "vocal_tremor",
+        "shaky voice": "vocal_tremor",
+        "voice went up": "voice_pitch_elevation",
+        "talking fast": "speech_rate_increase",
+        "talking slowly": "speech_rate_decrease",
+        "long pauses": "latency_increase",
+        "stammering": "speech_disfluency",
+        "stuttering": "speech_disfluency",
+        "answered question with question": "answering_with_question",
+        "blamed others": "blame_shifting",
+        "played victim": "victim_signaling",
+        "no empathy": "lack_empathy_verbal",
+        "bragging": "grandiose_statements",
+        "flattery": "love_bombing_speech",
+        "charming": "superficial_charm",
+    },
+    # Multi-word only: single common words ("date", "interview", "court")
+    # turn up in notes that are not about the setting at all.
+    "context": {
+        "hot room": "high_temperature",
+        "hot weather": "high_temperature",
+        "heat wave": "high_temperature",
+        "black tie": "formal_event",
+        "gala dinner": "formal_event",
+        "wedding reception": "formal_event",
+        "hospital room": "medical_setting",
+        "doctor office": "medical_setting",
+        "clinic visit": "medical_setting",
+        "blind date": "first_date",
+        "dinner date": "first_date",
+        "hiring interview": "job_interview",
+        "interview for job": "job_interview",
+        "court hearing": "court_setting",
+        "witness stand": "court_setting",
+        "police interview": "police_interrogation",
+        "police station": "police_interrogation",
+        "questioned by police": "police_interrogation",
+    },
+}
+
+STOPWORDS = frozenset(
+    "a an the his her their its he she they him them of to at on in into with "
+    "was were is are be been kept keep keeps very really".split()
+)
+
+# Words that negate the rest of their clause; "n't" is rewritten to " not" first.
+NEGATORS = frozenset("not no never without nor neither".split())
+
+_WORD = re.compile(r"[a-z]+")
+_CLAUSE = re.compile(r"[,.;:!?\n]+|\b(?:and|but|while|then)\b")
+_CONTRACTED_NOT = re.compile(r"n['\u2019]t\b")
+
+CueMatch = namedtuple("CueMatch", ["kind", "name", "score", "phrase"])
+
+
+def normalize(word: str) -> str:
+    """Lowercase word with a light suffix strip so "touching" matches "touch" """
+    for suffix in ("ing", "ed", "es", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def _tokens(text: str) -> List[str]:
+    return [normalize(word) for word in _WORD.findall(text.lower()) if word not in STOPWORDS]
+
+
+def _trigrams(token: str) -> frozenset:
+    padded = f"${token}$"
+    return frozenset(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+class CueResolver:
+    """Resolves analyst notes to scored cue and context matches"""
+
+    def __init__(self, engine: DeductionEngine, aliases: Optional[Dict[str, Dict[str, str]]] = None,
+                 min_score: float = 0.75, fuzzy_threshold: float = 0.5):
+        self.engine = engine
+        self.min_score = min_score
+        self.fuzzy_threshold = fuzzy_threshold
+
+        names = {
+            "cue": [cue for cues in engine.get_all_cues_by_category().values() for cue in cues],
+            "context": engine.get_context_options(),
+        }
+        phrases = [(kind, name, name.replace("_", " ")) for kind in names for name in names[kind]]
+        for kind, table in (DEFAULT_ALIASES if aliases is None else aliases).items():
+            known = set(names.get(kind, ()))
+            for phrase, name in table.items():
+                if name not in known:
+                    raise ValueError(f"alias {phrase!r} points to unknown {kind} {name!r}")
+                phrases.append((kind, name, phrase))
+
+        # entry id -> (kind, name, phrase, tokens); token -> entry ids
+        self._entries = []
+        self._token_index: Dict[str, List[int]] = {}
+        for kind, name, phrase in phrases:
+            tokens = tuple(dict.fromkeys(_tokens(phrase)))
+            if not tokens:
+                continue
+            for token in tokens:
+                self._token_index.setdefault(token, []).append(len(self._entries))
+            self._entries.append((kind, name, phrase, tokens))
+
+        self._trigram_index: Dict[str, List[str]] = {}
+        self._trigram_counts: Dict[str, int] = {}
+        for token in self._token_index:
+            grams = _trigrams(token)
+            self._trigram_counts[token] = len(grams)
+            for gram in grams:
+                self._trigram_index.setdefault(gram, []).append(token)
+        self._similar_cache: Dict[str, Tuple[Tuple[str, float], ...]] = {}
+
+    def _similar(self, token: str) -> Tuple[Tuple[str, float], ...]:
+        """Vocabulary tokens similar to token with their trigram Jaccard similarity"""
+        cached = self._similar_cache.get(token)
+        if cached is not None:
+            return cached
+        if token in self._token_index:
+            result = ((token, 1.0),)
+        else:
+            grams = _trigrams(token)
+            shared = {}
+            for gram in grams:
+                for candidate in self._trigram_index.get(gram, ()):
+                    shared[candidate] = shared.get(candidate, 0) + 1
+            result = []
+            for candidate, overlap in shared.items():
+                similarity = overlap / (len(grams) + self._trigram_counts[candidate] - overlap)
+                if similarity >= self.fuzzy_threshold:
+                    result.append((candidate, similarity))
+            result = tuple(result)
+        if len(self._similar_cache) < 100000:
+            self._similar_cache[token] = result
+        return result
+
+    def resolve(self, text: str, min_score: Optional[float] = None) -> List[CueMatch]:
+        """Returns the best match per cue/context found in text, highest score first.
+
+        Matches that follow a negator in their clause are left out.
+        """
+        threshold = self.min_score if min_score is None else min_score
+        entries = self._entries
+        token_index = self._token_index
+        best: Dict[Tuple[str, str], CueMatch] = {}
+
+        for clause in _CLAUSE.split(_CONTRACTED_NOT.sub(" not", text.lower())):
+            if not clause:
+                continue
+            # vocabulary token -> best similarity and first position in the clause
+            present: Dict[str, float] = {}
+            first_seen: Dict[str, int] = {}
+            negated_from = None
+            for position, token in enumerate(_tokens(clause)):
+                if token in NEGATORS and negated_from is None:
+                    negated_from = position
+                for vocab_token, similarity in self._similar(token):
+                    if similarity > present.get(vocab_token, 0.0):
+                        present[vocab_token] = similarity
+                    first_seen.setdefault(vocab_token, position)
+            candidates = set()
+            for vocab_token in present:
+                candidates.update(token_index[vocab_token])
+
+            for entry_id in candidates:
+                kind, name, phrase, tokens = entries[entry_id]
+                score = sum(present.get(token, 0.0) for token in tokens) / len(tokens)
+                if score < threshold:
+                    continue
+                # A negator inside the phrase itself ("did not flinch") does not count.
+                if negated_from is not None and negated_from < min(
+                        first_seen[token] for token in tokens if token in first_seen):
+                    continue
+                key = (kind, name)
+                if key not in best or score > best[key].score:
+                    best[key] = CueMatch(kind, name, round(score, 3), phrase)
+
+        return sorted(best.values(), key=lambda match: (-match.score, match.kind, match.name))
+
+    def resolve_many(self, texts: Iterable[str], min_score: Optional[float] = None) -> List[List[CueMatch]]:
+        return [self.resolve(text, min_score) for text in texts]
+
+    def observe(self, text: str, min_score: Optional[float] = None) -> Observation:
+        """Resolves text straight to an Observation for DeductionEngine.analyze"""
+        matches = self.resolve(text, min_score)
+        return self.engine.observe([m.name for m in matches if m.kind == "cue"],
+                                   [m.name for m in matches if m.kind == "context"])
+
+
+# Sample notes with the (cues, contexts) they must resolve to; run with --check.
+SAMPLE_NOTES = [
+    ("kept touching his neck, feet toward the door", {"neck_pacifying_touch", "feet_pointing_exit"}, set()),
+    ("he did not touch his neck", set(), set()),
+    ("he didn't touch his neck", set(), set()),
+    ("no signs of nail biting", set(), set()),
+    ("never once looked around the room", set(), set()),
+    ("arms crossed without smiling", {"ventral_shielding_high"}, set()),
+    ("did not flinch when the door slammed", {"lack_of_startle_response"}, set()),
+    ("showed no empathy for the victim", {"lack_empathy_verbal"}, set()),
+    ("set a date for the next interview", set(), set()),
+    ("talking fast during the job interview", {"speech_rate_increase"}, {"job_interview"}),
+    ("stammering on the witness stand, hot room", {"speech_disfluency"}, {"court_setting", "high_temperature"}),
+]
+
+
+def check_samples(resolver: CueResolver) -> List[str]:
+    """Resolves SAMPLE_NOTES and returns a description of each mismatch"""
+    failures = []
+    for text, cues, contexts in SAMPLE_NOTES:
+        matches = resolver.resolve(text)
+        got_cues = {m.name for m in matches if m.kind == "cue"}
+        got_contexts = {m.name for m in matches if m.kind == "context"}
+        if (got_cues, got_contexts) != (cues, contexts):
+            failures.append(f"{text!r}: expected {sorted(cues | contexts)}, got {sorted(got_cues | got_contexts)}")
+    return failures
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Resolve analyst notes to cue and context ids.")
+    parser.add_argument("text", nargs="*", help="notes to resolve")
+    parser.add_argument("--check", action="store_true", help="verify the built-in sample notes")
+    parser.add_argument("--library", help="JSON or compiled cue library file (default: built-in)")
+    args = parser.parse_args(argv)
+
+    resolver = CueResolver(DeductionEngine(library_path=args.library))
+    if args.check:
+        failures = check_samples(resolver)
+        for failure in failures:
+            print(f"FAIL {failure}")
+        print(f"{len(SAMPLE_NOTES) - len(failures)}/{len(SAMPLE_NOTES)} sample notes resolved as expected")
+        return 1 if failures else 0
+    for text in args.text:
+        for match in resolver.resolve(text):
+            print(f"{match.score:.3f}  {match.kind:<7}  {match.name}  ({match.phrase})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,312 @@
+"""Longitudinal profile tracking for many subjects from timestamped cue events.
+
+A SubjectTracker keeps running profile scores per subject instead of
+re-analyzing each subject's whole cue history on every event. Scores use one
+of two windows:
+
+* half_life: every cue weight decays exponentially with the given half-life
+  (seconds). Decay is applied lazily: weights are stored scaled to a
+  per-subject origin time, so an event only touches the profiles its cue
+  weights.
+* window: a sliding window of the last `window` seconds (and at most
+  max_events events); expired events are subtracted back out.
+
+Contexts set for a subject are applied at read time exactly as in analyze,
+including the clamp at zero. Whenever a profile's confidence band changes the
+tracker emits a ThresholdCrossing, e.g. a profile entering "Very High".
+Subjects that see no events for idle_timeout seconds are evicted, and
+max_subjects caps memory by evicting the least recently active subject.
+
+    tracker = SubjectTracker(engine, half_life=900, on_crossing=alert)
+    for subject, timestamp, cue in feed:
+        tracker.ingest(subject, timestamp, cue)
+
+Timestamps are seconds on any monotonic clock. A subject's events are
+expected in time order; an older event is treated as arriving at the
+subject's latest timestamp. Replacing the engine's library clears all subject
+state, since scores under different libraries are not comparable.
+"""
+
+import math
+from bisect import bisect_right
+from collections import OrderedDict, deque, namedtuple
+from typing import Callable, Dict, Hashable, Iterable, List, Optional, Tuple
+
+from deduction_engine_enhanced import DeductionEngine, ProfileResult, trim_report
+
+# A profile moving between confidence bands; previous/current are confidence
+# labels, or None below the first band (score zero or profile not touched).
+ThresholdCrossing = namedtuple("ThresholdCrossing",
+                               ["subject", "profile", "timestamp", "score", "previous", "current"])
+
+# Rescale decayed scores once the stored growth factor passes e**_RESCALE_AT.
+_RESCALE_AT = 50.0
+# Decayed contributions below this are dropped when rescaling.
+_NEGLIGIBLE = 1e-9
+
+
+class _Subject:
+    __slots__ = ("base", "touches", "origin", "events", "cue_seen", "contexts", "bands", "last_seen")
+
+    def __init__(self, timestamp: float):
+        # pid -> base total (scaled to origin in decay mode) and number of live events weighting it
+        self.base: Dict[int, float] = {}
+        self.touches: Dict[int, int] = {}
+        self.origin = timestamp
+        # (timestamp, cue) events still in the sliding window
+        self.events = deque()
+        # cue -> last time it was observed
+        self.cue_seen: Dict[str, float] = {}
+        self.contexts: Tuple[str, ...] = ()
+        # pid -> index of the confidence band last reported
+        self.bands: Dict[int, int] = {}
+        self.last_seen = timestamp
+
+
+class SubjectTracker:
+    """Per-subject decayed or sliding-window profile scores over a stream of cue events"""
+
+    def __init__(self, engine: DeductionEngine, half_life: Optional[float] = None, window: Optional[float] = None,
+                 max_events: int = 1000, idle_timeout: float = 3600.0, max_subjects: Optional[int] = None,
+                 on_crossing: Optional[Callable[[ThresholdCrossing], None]] = None):
+        if (half_life is None) == (window is None):
+            raise ValueError("pass exactly one of half_life or window")
+        if (half_life is not None and half_life <= 0) or (window is not None and window <= 0):
+            raise ValueError("half_life and window must be positive")
+        self.engine = engine
+        self.half_life = half_life
+        self.window = window
+        self.max_events = max_events
+        self.idle_timeout = idle_timeout
+        self.max_subjects = max_subjects
+        self.on_crossing = on_crossing
+        self._decay = math.log(2) / half_life if half_life is not None else None
+        # In decay mode a cue counts as present for incongruence checks for three half-lives.
+        self.cue_ttl = window if window is not None else 3 * half_life
+        self._subjects: "OrderedDict[Hashable, _Subject]" = OrderedDict()
+        self._generation = engine.library_generation
+        self._context_maps: Dict[str, Dict[int, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._subjects)
+
+    def __contains__(self, subject: Hashable) -> bool:
+        return subject in self._subjects
+
+    def subjects(self) -> List[Hashable]:
+        return list(self._subjects)
+
+    def _sync(self):
+        if self.engine.library_generation != self._generation:
+            self._generation = self.engine.library_generation
+            self._subjects.clear()
+            self._context_maps.clear()
+
+    def _subject(self, subject: Hashable, timestamp: float) -> _Subject:
+        state = self._subjects.get(subject)
+        if state is None:
+            state = self._subjects[subject] = _Subject(timestamp)
+            if self.max_subjects is not None and len(self._subjects) > self.max_subjects:
+                self._subjects.popitem(last=False)
+        else:
+            self._subjects.move_to_end(subject)
+        return state
+
+    # --- Ingestion ---
+    def ingest(self, subject: Hashable, timestamp: float, cue: str) -> List[ThresholdCrossing]:
+        """Records one cue event; returns the band crossings it caused"""
+        self._sync()
+        self.evict_idle(timestamp)
+        state = self._subject(subject, timestamp)
+        timestamp = max(timestamp, state.last_seen)
+        state.last_seen = timestamp
+        state.cue_seen[cue] = timestamp
+
+        changed = set()
+        if self._decay is None:
+            self._expire(state, timestamp, changed)
+            state.events.append((timestamp, cue))
+            self._apply(state, cue, 1, changed)
+            if len(state.events) > self.max_events:
+                _, oldest = state.events.popleft()
+                self._apply(state, oldest, -1, changed)
+        else:
+            growth = self._decay * (timestamp - state.origin)
+            if growth > _RESCALE_AT:
+                self._rescale(state, timestamp)
+                growth = 0.0
+            self._apply(state, cue, math.exp(growth), changed)
+        return self._regrade(subject, state, changed, timestamp)
+
+    def ingest_many(self, events: Iterable[Tuple[Hashable, float, str]]) -> List[ThresholdCrossing]:
+        crossings = []
+        for subject, timestamp, cue in events:
+            crossings.extend(self.ingest(subject, timestamp, cue))
+        return crossings
+
+    def set_contexts(self, subject: Hashable, contexts: Iterable[str], timestamp: float) -> List[ThresholdCrossing]:
+        """Replaces a subject's environmental contexts; returns the band crossings it caused"""
+        self._sync()
+        state = self._subject(subject, timestamp)
+        state.last_seen = max(timestamp, state.last_seen)
+        contexts = tuple(contexts)
+        changed = set()
+        for context in set(state.contexts).symmetric_difference(contexts):
+            changed.update(self._context_map(context).keys() & state.base.keys())
+        state.contexts = contexts
+        return self._regrade(subject, state, changed, state.last_seen)
+
+    def _apply(self, state: _Subject, cue: str, scale: float, changed: set):
+        """Adds one event's weights times scale; a negative scale removes the event"""
+        base, touches = state.base, state.touches
+        step = 1 if scale > 0 else -1
+        for _, profile_ids, weights in self.engine.cue_segments(cue):
+            for pid, weight in zip(profile_ids, weights):
+                count = touches.get(pid, 0) + step
+                if count:
+                    touches[pid] = count
+                    base[pid] = base.get(pid, 0) + weight * scale
+                else:
+                    del touches[pid], base[pid]
+                changed.add(pid)
+
+    def _expire(self, state: _Subject, now: float, changed: set):
+        events = state.events
+        horizon = now - self.window
+        while events and events[0][0] <= horizon:
+            _, cue = events.popleft()
+            self._apply(state, cue, -1, changed)
+
+    def _rescale(self, state: _Subject, timestamp: float):
+        factor = math.exp(-self._decay * (timestamp - state.origin))
+        base = state.base
+        for pid in list(base):
+            value = base[pid] * factor
+            if abs(value) < _NEGLIGIBLE:
+                del base[pid], state.touches[pid]
+                state.bands.pop(pid, None)
+            else:
+                base[pid] = value
+        state.origin = timestamp
+
+    # --- Scoring ---
+    def _current(self, state: _Subject, pid: int, now: float) -> float:
+        """Base total decayed to now with the subject's contexts applied, as analyze does"""
+        score = state.base.get(pid)
+        if score is None:
+            return 0
+        if self._decay is not None:
+            score *= math.exp(-self._decay * (now - state.origin))
+        for context in state.contexts:
+            modifier = self._context_map(context).get(pid)
+            if modifier is not None:
+                score += modifier
+                if score < 0:
+                    score = 0
+        return score
+
+    def _context_map(self, context: str) -> Dict[int, float]:
+        mapping = self._context_maps.get(context)
+        if mapping is None:
+            mapping = self._context_maps[context] = self.engine.context_modifiers(context)
+        return mapping
+
+    def _band(self, score: float) -> int:
+        return bisect_right(self.engine.grade_thresholds, score) if score > 0 else -1
+
+    def _regrade(self, subject: Hashable, state: _Subject, pids: Iterable[int],
+                 now: float) -> List[ThresholdCrossing]:
+        crossings = []
+        grades = self.engine.grades
+        profile_names = self.engine.profile_names
+        for pid in pids:
+            score = self._current(state, pid, now)
+            band = self._band(score)
+            previous = state.bands.get(pid, -1)
+            if band == previous:
+                continue
+            if band < 0:
+                del state.bands[pid]
+            else:
+                state.bands[pid] = band
+            crossings.append(ThresholdCrossing(
+                subject, profile_names[pid], now, score,
+                grades[previous][0] if previous >= 0 else None,
+                grades[band][0] if band >= 0 else None,
+            ))
+        if self.on_crossing is not None:
+            for crossing in crossings:
+                self.on_crossing(crossing)
+        return crossings
+
+    # --- Queries and maintenance ---
+    def report(self, subject: Hashable, now: Optional[float] = None, top_k: Optional[int] = None,
+               min_score: Optional[float] = None) -> List[ProfileResult]:
+        """Ranked profiles for a subject at time now (default: its latest event)"""
+        self._sync()
+        state = self._subjects.get(subject)
+        if state is None:
+            return []
+        now = state.last_seen if now is None else now
+        if self._decay is None:
+            self._regrade(subject, state, self._expire_changed(state, now), now)
+        scored = [(pid, self._current(state, pid, now)) for pid in state.base]
+        ranked = sorted((item for item in scored if item[1] > 0), key=lambda item: item[1], reverse=True)
+        thresholds, grades, profile_names = self.engine.grade_thresholds, self.engine.grades, self.engine.profile_names
+        report = []
+        for pid, score in ranked:
+            confidence, threat_level = grades[bisect_right(thresholds, score)]
+            report.append(ProfileResult(profile_names[pid], score, confidence, threat_level))
+        return trim_report(report, top_k, min_score)
+
+    def _expire_changed(self, state: _Subject, now: float) -> set:
+        changed = set()
+        self._expire(state, now, changed)
+        return changed
+
+    def active_cues(self, subject: Hashable, now: Optional[float] = None) -> List[str]:
+        """Cues a subject showed within cue_ttl of now"""
+        state = self._subjects.get(subject)
+        if state is None:
+            return []
+        now = state.last_seen if now is None else now
+        return [cue for cue, seen in state.cue_seen.items() if now - seen < self.cue_ttl]
+
+    def conflicts(self, subject: Hashable, now: Optional[float] = None) -> List[str]:
+        """Incongruence findings over the subject's currently active cues"""
+        return self.engine.detect_incongruence(self.active_cues(subject, now))
+
+    def evict_idle(self, now: float) -> List[Hashable]:
+        """Drops subjects with no events for idle_timeout seconds; returns their ids"""
+        evicted = []
+        horizon = now - self.idle_timeout
+        subjects = self._subjects
+        while subjects:
+            subject, state = next(iter(subjects.items()))
+            if state.last_seen > horizon:
+                break
+            del subjects[subject]
+            evicted.append(subject)
+        return evicted
+
+    def sweep(self, now: float) -> List[ThresholdCrossing]:
+        """Evicts idle subjects, then re-grades every tracked profile at time now.
+
+        Decay and window expiry lower scores between events; ingest only
+        reports crossings for the profiles an event touched, so call this
+        periodically to also catch profiles that drifted out of a band.
+        """
+        self._sync()
+        self.evict_idle(now)
+        crossings = []
+        for subject, state in self._subjects.items():
+            pids = set(state.bands)
+            if self._decay is None:
+                pids |= self._expire_changed(state, now)
+            crossings.extend(self._regrade(subject, state, pids, now))
+            for cue in [cue for cue, seen in state.cue_seen.items() if now - seen >= self.cue_ttl]:
+                del state.cue_seen[cue]
+        return crossings
+
+    def forget(self, subject: Hashable) -> bool:
+        return self._subjects.pop(subject, None) is not None